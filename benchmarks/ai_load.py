@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный бенчмарк AI-пути бота на локальной заглушке (без сети и без квоты API)
+
+Запускает заглушку benchmarks/ai_stub.py в своем процессе (или использует уже
+запущенную через --url) и гоняет через AIServices текстовые, потоковые и
+фото-запросы от множества пользователей: планировщик, маршрутизация по моделям,
+пул соединений и метрики работают так же, как в боте.
+
+Запуск:
+    python benchmarks/ai_load.py --users 50 --requests 20 --mode mixed
+    python benchmarks/ai_load.py --latency pareto:0.3:1.5 --error-rate 0.05 --mode text
+    python benchmarks/ai_load.py --url http://127.0.0.1:8089 --mode stream
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Добавляем корневую директорию в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from aiohttp import web
+
+from ai_stub import GEMINI_PREFIX, OPENROUTER_PREFIX, add_stub_arguments, build_stub
+
+# Фото из Telegram - JPEG; содержимое заглушке не важно, важен размер тела запроса
+JPEG_HEADER = b"\xff\xd8\xff\xe0"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return None
+    index = min(max(int(round(q * len(values))) - 1, 0), len(values) - 1)
+    return values[index]
+
+
+def format_ms(value: Optional[float]) -> str:
+    return "—" if value is None else f"{value * 1000:.0f}"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_load(ai_services, args: argparse.Namespace) -> Dict[str, Dict]:
+    """Закрытая нагрузка: каждый пользователь отправляет запросы последовательно"""
+    results: Dict[str, Dict] = {}
+    image_size = args.image_kb * 1024
+    
+    def result(kind: str) -> Dict:
+        if kind not in results:
+            results[kind] = {"latency": [], "ttfb": [], "failed": 0}
+        return results[kind]
+    
+    async def text_request(user_id: int, n: int):
+        started = time.perf_counter()
+        answer = await ai_services.get_openrouter_response(f"Вопрос {n} от пользователя {user_id}", user_id=user_id)
+        stats = result("text")
+        if answer is None:
+            stats["failed"] += 1
+        else:
+            stats["latency"].append(time.perf_counter() - started)
+    
+    async def stream_request(user_id: int, n: int):
+        started = time.perf_counter()
+        first_chunk_at = None
+        async for _ in ai_services.stream_openrouter_response(f"Поток {n} от пользователя {user_id}", user_id=user_id):
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+        stats = result("stream")
+        if first_chunk_at is None:
+            stats["failed"] += 1
+        else:
+            stats["latency"].append(time.perf_counter() - started)
+            stats["ttfb"].append(first_chunk_at - started)
+    
+    async def image_request(user_id: int, n: int):
+        # Уникальные байты, чтобы одинаковые запросы не объединялись
+        image = JPEG_HEADER + os.urandom(image_size)
+        started = time.perf_counter()
+        answer = await ai_services.analyze_image_with_gemini(image, user_id=user_id)
+        stats = result("image")
+        if answer is None:
+            stats["failed"] += 1
+        else:
+            stats["latency"].append(time.perf_counter() - started)
+    
+    kinds = {"text": [text_request], "stream": [stream_request], "image": [image_request]}
+    kinds["mixed"] = [text_request, text_request, stream_request, stream_request, image_request]
+    requests = kinds[args.mode]
+    
+    async def user(user_id: int):
+        for n in range(args.requests):
+            await random.choice(requests)(user_id, n)
+            if args.think:
+                await asyncio.sleep(random.expovariate(1 / args.think))
+    
+    await asyncio.gather(*(user(100000 + i) for i in range(args.users)))
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк AI-пути на локальной заглушке")
+    parser.add_argument("--users", type=int, default=50, help="Количество одновременных пользователей")
+    parser.add_argument("--requests", type=int, default=20, help="Запросов на одного пользователя")
+    parser.add_argument("--mode", choices=["text", "stream", "image", "mixed"], default="mixed", help="Вид запросов")
+    parser.add_argument("--think", type=float, default=0.0, help="Средняя пауза пользователя между запросами, с")
+    parser.add_argument("--image-kb", type=int, default=200, help="Размер изображения, КБ")
+    parser.add_argument("--url", default=None, help="Адрес уже запущенной заглушки (иначе запускается своя)")
+    parser.add_argument("--log-level", default="CRITICAL", help="Уровень логов бота (ошибки видны в итоговой таблице)")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    
+    runner = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        runner = web.AppRunner(build_stub(args).app())
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+    
+    # Адреса API читаются config.py при импорте, поэтому задаются до импорта сервисов
+    os.environ["OPENROUTER_BASE_URL"] = url.rstrip("/") + OPENROUTER_PREFIX
+    os.environ["GEMINI_BASE_URL"] = url.rstrip("/") + GEMINI_PREFIX
+    
+    from loguru import logger
+    from utils.ai_metrics import ai_metrics
+    from utils.ai_services import ai_services
+    from utils.scheduler import ai_scheduler
+    
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    
+    await ai_services.start()
+    started = time.perf_counter()
+    try:
+        results = await run_load(ai_services, args)
+    finally:
+        elapsed = time.perf_counter() - started
+        await ai_services.close()
+        if runner is not None:
+            await runner.cleanup()
+    
+    total = sum(len(stats["latency"]) for stats in results.values())
+    print(f"Пользователей: {args.users}, запросов: {args.users * args.requests}, время: {elapsed:.1f} с")
+    print(f"Пропускная способность: {total / elapsed:.1f} успешных запросов/с\n")
+    
+    print(f"{'вид':<8} {'успешно':>8} {'ошибок':>7} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'max мс':>8} {'ttfb p50':>9}")
+    for kind, stats in sorted(results.items()):
+        latency = sorted(stats["latency"])
+        ttfb = sorted(stats["ttfb"])
+        print(
+            f"{kind:<8} {len(latency):>8} {stats['failed']:>7} "
+            f"{format_ms(percentile(latency, 0.5)):>8} {format_ms(percentile(latency, 0.95)):>8} "
+            f"{format_ms(percentile(latency, 0.99)):>8} {format_ms(latency[-1] if latency else None):>8} "
+            f"{format_ms(percentile(ttfb, 0.5)):>9}"
+        )
+    
+    print(f"\n{'модель':<32} {'запросов':>9} {'ошибок':>7} {'отменено':>9} {'токенов':>9}")
+    for model, stats in sorted(ai_metrics.stats().items()):
+        print(
+            f"{model:<32} {stats['requests']:>9} {sum(stats['errors'].values()):>7} "
+            f"{stats['cancelled']:>9} {stats['prompt_tokens'] + stats['completion_tokens']:>9}"
+        )
+    
+    print(f"\nОчереди: {ai_scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
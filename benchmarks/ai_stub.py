@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка OpenRouter и Gemini для бенчмарков без сети
+
+Отвечает на chat/completions (включая потоковый режим) и generateContent:
+синтезирует ответы с заданным распределением задержки и долей ошибок,
+записывает ответы настоящих API или воспроизводит записанные.
+
+Запуск:
+    python benchmarks/ai_stub.py --latency lognormal:0.8:0.5 --error-rate 0.02
+    python benchmarks/ai_stub.py --record recordings.jsonl
+    python benchmarks/ai_stub.py --replay recordings.jsonl
+
+Бот направляется на заглушку переменными окружения:
+    OPENROUTER_BASE_URL=http://127.0.0.1:8089/api/v1
+    GEMINI_BASE_URL=http://127.0.0.1:8089/v1beta/models
+
+Распределения задержки (секунды): fixed:S, uniform:MIN:MAX, normal:MEAN:STD,
+lognormal:MEDIAN:SIGMA, pareto:MIN:ALPHA.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+OPENROUTER_PREFIX = "/api/v1"
+GEMINI_PREFIX = "/v1beta/models"
+OPENROUTER_UPSTREAM = "https://openrouter.ai/api/v1"
+GEMINI_UPSTREAM = "https://generativelanguage.googleapis.com/v1beta/models"
+
+# Gemini считает каждое изображение как 258 токенов
+GEMINI_IMAGE_TOKENS = 258
+
+WORDS = (
+    "это синтетический ответ заглушки для нагрузочного тестирования бота он не "
+    "несет смысла но по длине и структуре похож на настоящий ответ модели"
+).split()
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Распределение задержки из строки вида "lognormal:0.8:0.5"
+    
+    Returns:
+        Функция, возвращающая очередное значение задержки в секундах
+    """
+    name, _, params = spec.partition(":")
+    try:
+        values = [float(value) for value in params.split(":")] if params else []
+    except ValueError:
+        raise ValueError(f"Некорректные параметры задержки: {spec}")
+    
+    if name == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if name == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if name == "normal" and len(values) == 2:
+        return lambda: max(random.gauss(values[0], values[1]), 0.0)
+    if name == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    if name == "pareto" and len(values) == 2:
+        return lambda: values[0] * random.paretovariate(values[1])
+    raise ValueError(f"Некорректное распределение задержки: {spec}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительное число токенов в тексте"""
+    return max(len(text) // 4, 1)
+
+
+def synth_text(words: int) -> str:
+    """Текст ответа заданной длины в словах"""
+    return " ".join(random.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def request_key(kind: str, model: str, text: str, extra: str = "") -> str:
+    """Ключ записанного ответа: тип запроса, модель и содержимое промпта"""
+    return hashlib.sha256(f"{kind}\0{model}\0{text}\0{extra}".encode("utf-8")).hexdigest()
+
+
+def sse_event(data: Dict[str, Any]) -> bytes:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+class Recordings:
+    """
+    Записанные ответы в JSONL файле
+    
+    При воспроизведении ответ ищется по ключу запроса; если такого запроса не
+    записывали, по кругу отдаются записи того же типа.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.by_key: Dict[str, Dict[str, Any]] = {}
+        self.by_kind: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        self.misses = 0
+    
+    def load(self):
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._add(json.loads(line))
+    
+    def _add(self, record: Dict[str, Any]):
+        self.by_key[record["key"]] = record
+        self.by_kind.setdefault(record["kind"], []).append(record)
+    
+    def append(self, record: Dict[str, Any]):
+        self._add(record)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    def find(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        record = self.by_key.get(key)
+        if record is not None:
+            return record
+        
+        self.misses += 1
+        records = self.by_kind.get(kind)
+        if not records:
+            return None
+        index = self._cursor.get(kind, 0)
+        self._cursor[kind] = index + 1
+        return records[index % len(records)]
+
+
+class AIStub:
+    """Заглушка AI API: синтез, запись или воспроизведение ответов"""
+    
+    def __init__(
+        self,
+        latency: Callable[[], float],
+        model_latency: Optional[Dict[str, Callable[[], float]]] = None,
+        error_rate: float = 0.0,
+        error_statuses: Optional[List[int]] = None,
+        stall_rate: float = 0.0,
+        stall: float = 120.0,
+        words: int = 60,
+        chunks: int = 20,
+        chunk_interval: float = 0.02,
+        recordings: Optional[Recordings] = None,
+        record: bool = False,
+        use_recorded_latency: bool = True,
+        openrouter_upstream: str = OPENROUTER_UPSTREAM,
+        gemini_upstream: str = GEMINI_UPSTREAM
+    ):
+        self.latency = latency
+        self.model_latency = model_latency or {}
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses or [500, 503, 429]
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.words = words
+        self.chunks = chunks
+        self.chunk_interval = chunk_interval
+        self.recordings = recordings
+        self.record = record
+        self.use_recorded_latency = use_recorded_latency
+        self.openrouter_upstream = openrouter_upstream.rstrip("/")
+        self.gemini_upstream = gemini_upstream.rstrip("/")
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.counters: Dict[str, int] = {"requests": 0, "errors": 0, "stalls": 0, "streams": 0}
+    
+    def app(self) -> web.Application:
+        """Приложение aiohttp с маршрутами обоих API"""
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post(f"{OPENROUTER_PREFIX}/chat/completions", self.chat_completions)
+        app.router.add_post(f"{GEMINI_PREFIX}/{{target}}", self.generate_content)
+        app.router.add_get("/stats", self.stats)
+        app.on_cleanup.append(self._close_session)
+        return app
+    
+    async def _close_session(self, _app: web.Application):
+        if self._session is not None:
+            await self._session.close()
+    
+    def _delay(self, model: str) -> float:
+        return self.model_latency.get(model, self.latency)()
+    
+    async def _fault(self, model: str) -> Optional[web.Response]:
+        """Имитация зависания или ошибки; None - запрос обрабатывается дальше"""
+        self.counters["requests"] += 1
+        if self.stall_rate and random.random() < self.stall_rate:
+            self.counters["stalls"] += 1
+            await asyncio.sleep(self.stall)
+        if self.error_rate and random.random() < self.error_rate:
+            self.counters["errors"] += 1
+            await asyncio.sleep(self._delay(model) / 4)
+            status = random.choice(self.error_statuses)
+            return web.json_response({"error": {"code": status, "message": "stub error"}}, status=status)
+        return None
+    
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        """POST /api/v1/chat/completions"""
+        raw = await request.read()
+        payload = json.loads(raw)
+        model = payload.get("model", "")
+        stream = bool(payload.get("stream"))
+        prompt = "\n".join(str(message.get("content", "")) for message in payload.get("messages", []))
+        kind = "chat_stream" if stream else "chat"
+        key = request_key(kind, model, prompt)
+        
+        if self.record:
+            return await self._proxy(
+                request, raw, f"{self.openrouter_upstream}/chat/completions", kind, key, model
+            )
+        
+        fault = await self._fault(model)
+        if fault is not None:
+            return fault
+        
+        if self.recordings is not None:
+            recorded = self.recordings.find(kind, key)
+            if recorded is not None:
+                return await self._replay(request, recorded, model)
+        
+        text = synth_text(self.words)
+        usage = {
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(text),
+            "total_tokens": estimate_tokens(prompt) + estimate_tokens(text)
+        }
+        
+        if not stream:
+            await asyncio.sleep(self._delay(model))
+            return web.json_response({
+                "id": f"stub-{key[:12]}",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+        
+        self.counters["streams"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b": OPENROUTER PROCESSING\n\n")
+        await asyncio.sleep(self._delay(model))
+        
+        words = text.split(" ")
+        step = max(math.ceil(len(words) / self.chunks), 1)
+        for start in range(0, len(words), step):
+            piece = " ".join(words[start:start + step])
+            if start:
+                piece = " " + piece
+                await asyncio.sleep(self.chunk_interval)
+            await response.write(sse_event({"model": model, "choices": [{"index": 0, "delta": {"content": piece}}]}))
+        await response.write(sse_event({
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": usage
+        }))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+    
+    async def generate_content(self, request: web.Request) -> web.Response:
+        """POST /v1beta/models/{model}:generateContent"""
+        model, _, action = request.match_info["target"].partition(":")
+        if action != "generateContent":
+            raise web.HTTPNotFound()
+        
+        raw = await request.read()
+        payload = json.loads(raw)
+        texts: List[str] = []
+        images: List[str] = []
+        for content in payload.get("contents", []):
+            for part in content.get("parts", []):
+                if "text" in part:
+                    texts.append(part["text"])
+                elif "inline_data" in part or "inlineData" in part:
+                    inline = part.get("inline_data") or part.get("inlineData")
+                    images.append(hashlib.sha256(inline.get("data", "").encode("ascii")).hexdigest())
+        prompt = "\n".join(texts)
+        key = request_key("gemini", model, prompt, ",".join(images))
+        
+        if self.record:
+            upstream = f"{self.gemini_upstream}/{request.match_info['target']}?{request.query_string}"
+            return await self._proxy(request, raw, upstream, "gemini", key, model)
+        
+        fault = await self._fault(model)
+        if fault is not None:
+            return fault
+        
+        if self.recordings is not None:
+            recorded = self.recordings.find("gemini", key)
+            if recorded is not None:
+                return await self._replay(request, recorded, model)
+        
+        text = synth_text(self.words)
+        await asyncio.sleep(self._delay(model))
+        return web.json_response({
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {
+                "promptTokenCount": estimate_tokens(prompt) + GEMINI_IMAGE_TOKENS * len(images),
+                "candidatesTokenCount": estimate_tokens(text)
+            }
+        })
+    
+    async def _proxy(
+        self,
+        request: web.Request,
+        raw: bytes,
+        url: str,
+        kind: str,
+        key: str,
+        model: str
+    ) -> web.StreamResponse:
+        """
+        Запрос к настоящему API с записью ответа
+        
+        Потоковые ответы пересылаются клиенту по мере получения; временем до первого
+        байта считается приход первого события data.
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300))
+        
+        headers = {
+            name: value for name, value in request.headers.items()
+            if name.lower() in ("authorization", "content-type", "http-referer", "x-title")
+        }
+        self.counters["requests"] += 1
+        started = time.monotonic()
+        ttfb = None
+        async with self._session.post(url, data=raw, headers=headers) as upstream:
+            status = upstream.status
+            content_type = upstream.headers.get("Content-Type", "application/json")
+            if status != 200 or not kind.endswith("_stream"):
+                body = await upstream.read()
+                ttfb = time.monotonic() - started
+                response = web.Response(body=body, status=status, headers={"Content-Type": content_type})
+            else:
+                self.counters["streams"] += 1
+                response = web.StreamResponse(headers={"Content-Type": content_type})
+                await response.prepare(request)
+                received = bytearray()
+                async for line in upstream.content:
+                    if ttfb is None and line.startswith(b"data:"):
+                        ttfb = time.monotonic() - started
+                    received += line
+                    await response.write(line)
+                await response.write_eof()
+                body = bytes(received)
+            elapsed = time.monotonic() - started
+        
+        if status == 200:
+            self.recordings.append({
+                "kind": kind,
+                "key": key,
+                "model": model,
+                "status": status,
+                "content_type": content_type,
+                "ttfb": round(ttfb or elapsed, 4),
+                "elapsed": round(elapsed, 4),
+                "body": body.decode("utf-8")
+            })
+        else:
+            self.counters["errors"] += 1
+        return response
+    
+    async def _replay(self, request: web.Request, recorded: Dict[str, Any], model: str) -> web.StreamResponse:
+        """Ответ из записи; потоковые ответы отдаются по событиям с исходным темпом"""
+        if self.use_recorded_latency:
+            delay = recorded.get("ttfb", 0.0)
+        else:
+            delay = self._delay(model)
+        body: str = recorded["body"]
+        
+        if not recorded["kind"].endswith("_stream"):
+            await asyncio.sleep(delay)
+            return web.Response(
+                text=body,
+                status=recorded.get("status", 200),
+                content_type=recorded.get("content_type", "application/json").split(";")[0]
+            )
+        
+        self.counters["streams"] += 1
+        events = [event for event in body.split("\n\n") if event.strip()]
+        if self.use_recorded_latency and len(events) > 1:
+            interval = max(recorded.get("elapsed", 0.0) - delay, 0.0) / (len(events) - 1)
+        else:
+            interval = self.chunk_interval
+        
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(delay)
+        for index, event in enumerate(events):
+            if index:
+                await asyncio.sleep(interval)
+            await response.write(event.encode("utf-8") + b"\n\n")
+        await response.write_eof()
+        return response
+    
+    async def stats(self, request: web.Request) -> web.Response:
+        """GET /stats - счетчики заглушки"""
+        counters = dict(self.counters)
+        if self.recordings is not None:
+            counters["replay_misses"] = self.recordings.misses
+            counters["recordings"] = len(self.recordings.by_key)
+        return web.json_response(counters)
+
+
+def build_stub(args: argparse.Namespace) -> AIStub:
+    """Заглушка по аргументам командной строки"""
+    model_latency = {}
+    for item in args.model_latency:
+        model, _, spec = item.rpartition("=")
+        model_latency[model] = parse_latency(spec)
+    
+    record = getattr(args, "record", None)
+    recordings = None
+    if record or args.replay:
+        recordings = Recordings(Path(record or args.replay))
+        if args.replay:
+            recordings.load()
+    
+    return AIStub(
+        latency=parse_latency(args.latency or "lognormal:0.8:0.4"),
+        model_latency=model_latency,
+        error_rate=args.error_rate,
+        error_statuses=[int(status) for status in args.error_status.split(",")],
+        stall_rate=args.stall_rate,
+        stall=args.stall,
+        words=args.words,
+        chunks=args.chunks,
+        chunk_interval=args.chunk_interval,
+        recordings=recordings,
+        record=bool(record),
+        # Явно заданная задержка заменяет записанную
+        use_recorded_latency=args.latency is None,
+        openrouter_upstream=getattr(args, "openrouter_upstream", OPENROUTER_UPSTREAM),
+        gemini_upstream=getattr(args, "gemini_upstream", GEMINI_UPSTREAM)
+    )
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """Аргументы заглушки (общие с бенчмарком, который запускает ее в своем процессе)"""
+    parser.add_argument("--latency", default=None, help="Задержка до первого байта (по умолчанию lognormal:0.8:0.4)")
+    parser.add_argument(
+        "--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+        help="Задержка для отдельной модели (можно повторять)"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой")
+    parser.add_argument("--error-status", default="500,503,429", help="HTTP статусы ошибок")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Доля зависающих запросов")
+    parser.add_argument("--stall", type=float, default=120.0, help="Длительность зависания, с")
+    parser.add_argument("--words", type=int, default=60, help="Длина синтетического ответа в словах")
+    parser.add_argument("--chunks", type=int, default=20, help="Фрагментов в потоковом ответе")
+    parser.add_argument("--chunk-interval", type=float, default=0.02, help="Пауза между фрагментами, с")
+    parser.add_argument("--replay", default=None, help="Воспроизведение ответов из JSONL файла")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка OpenRouter и Gemini")
+    parser.add_argument("--host", default="127.0.0.1", help="Адрес")
+    parser.add_argument("--port", type=int, default=8089, help="Порт")
+    parser.add_argument("--record", default=None, help="Проксирование к настоящим API с записью в JSONL файл")
+    parser.add_argument("--openrouter-upstream", default=OPENROUTER_UPSTREAM, help="Адрес OpenRouter для записи")
+    parser.add_argument("--gemini-upstream", default=GEMINI_UPSTREAM, help="Адрес Gemini для записи")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error("--record и --replay несовместимы")
+    
+    stub = build_stub(args)
+    print(f"OPENROUTER_BASE_URL=http://{args.host}:{args.port}{OPENROUTER_PREFIX}")
+    print(f"GEMINI_BASE_URL=http://{args.host}:{args.port}{GEMINI_PREFIX}")
+    web.run_app(stub.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк записи в SQLite для разных профилей (SQLITE_PROFILE)
+
+Запуск:
+    python benchmarks/sqlite_profile.py --writers 16 --writes 200 --readers 4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import insert, select, func
+
+from database.models import Base, Message, create_engines
+from database.sqlite_profile import SQLITE_PROFILES
+
+
+async def run_profile(profile: str, writers: int, writes: int, readers: int) -> dict:
+    """Конкурентная запись одиночными транзакциями при параллельном чтении"""
+    with tempfile.TemporaryDirectory() as directory:
+        read_engine, write_engine = create_engines(f"sqlite:///{os.path.join(directory, 'bench.db')}", profile)
+        async with write_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        
+        messages = Message.__table__
+        stop = asyncio.Event()
+        result = {"writes": 0, "errors": 0, "reads": 0}
+        
+        async def writer(n: int):
+            for i in range(writes):
+                try:
+                    async with write_engine.begin() as conn:
+                        await conn.execute(insert(messages).values(
+                            user_id=n,
+                            message_id=i,
+                            chat_id=n,
+                            message_type="text",
+                            content="benchmark",
+                            created_at=datetime.now()
+                        ))
+                    result["writes"] += 1
+                except Exception:
+                    result["errors"] += 1
+        
+        async def reader():
+            while not stop.is_set():
+                try:
+                    async with read_engine.connect() as conn:
+                        await conn.execute(select(func.count()).select_from(messages).where(messages.c.user_id == 0))
+                    result["reads"] += 1
+                except Exception:
+                    result["errors"] += 1
+                # Читатели имитируют запросы обработчиков, а не занимают весь цикл событий
+                await asyncio.sleep(0.005)
+        
+        reader_tasks = [asyncio.create_task(reader()) for _ in range(readers)]
+        started = time.perf_counter()
+        await asyncio.gather(*(writer(n) for n in range(writers)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*reader_tasks)
+        
+        await read_engine.dispose()
+        if write_engine is not read_engine:
+            await write_engine.dispose()
+    
+    result["writes_per_sec"] = result["writes"] / elapsed
+    result["reads_per_sec"] = result["reads"] / elapsed
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк записи в SQLite по профилям")
+    parser.add_argument("--writers", type=int, default=16, help="Количество конкурентных писателей")
+    parser.add_argument("--writes", type=int, default=200, help="Транзакций на одного писателя")
+    parser.add_argument("--readers", type=int, default=4, help="Количество параллельных читателей")
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PROFILES), help="Профили для сравнения")
+    args = parser.parse_args()
+    
+    print(f"{'профиль':<12} {'записей/с':>10} {'чтений/с':>10} {'ошибок':>8}")
+    for profile in args.profiles:
+        result = await run_profile(profile, args.writers, args.writes, args.readers)
+        print(
+            f"{profile:<12} {result['writes_per_sec']:>10.0f} "
+            f"{result['reads_per_sec']:>10.0f} {result['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -8,10 +8,18 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.enums import ParseMode
 from loguru import logger
 
-from config import BOT_TOKEN, ADMIN_IDS, ENABLE_STATISTICS
+from config import BOT_TOKEN, ADMIN_IDS, ENABLE_STATISTICS, ARCHIVE_ENABLED, CONVERSATION_ENABLED
 from handlers import register_handlers
-from database.models import init_database
+from database.models import init_database, close_database
+from database.activity import activity_buffer
+from database.archive import message_archive
+from database.stats import stats_rollup
+from database.retention import message_retention
 from utils.helpers import setup_middlewares
+from utils.ai_services import ai_services
+from utils.response_cache import response_cache
+from utils.conversation import conversation_memory
+from utils.images import shutdown_image_workers
 
 
 class ChatBot:
@@ -41,6 +49,15 @@ class ChatBot:
         try:
             logger.info("Инициализация базы данных...")
             await init_database()
+            activity_buffer.start()
+            if ARCHIVE_ENABLED:
+                message_archive.start()
+            if ENABLE_STATISTICS:
+                stats_rollup.start()
+            message_retention.start()
+            if CONVERSATION_ENABLED:
+                conversation_memory.start()
+            await ai_services.start()
             
             logger.info("Запуск бота...")
             await self.dp.start_polling(self.bot)
@@ -51,11 +68,29 @@ class ChatBot:
     
     async def stop(self):
         """Остановка бота"""
-        try:
-            logger.info("Остановка бота...")
-            await self.bot.session.close()
-        except Exception as e:
-            logger.error(f"Ошибка при остановке бота: {e}")
+        logger.info("Остановка бота...")
+        
+        # Буферы записи в базу сбрасываются первыми: ошибка при закрытии
+        # остальных сервисов не должна терять накопленные данные
+        steps = [
+            ("сессия бота", self.bot.session.close),
+            ("буфер активности", activity_buffer.stop),
+            ("архив сообщений", message_archive.stop),
+            ("агрегация статистики", stats_rollup.stop),
+            ("очистка сообщений", message_retention.stop),
+            ("AI сервисы", ai_services.close),
+            ("кэш AI ответов", response_cache.close),
+            ("память разговоров", conversation_memory.stop),
+            ("пул обработки изображений", shutdown_image_workers),
+            ("база данных", close_database)
+        ]
+        for name, step in steps:
+            try:
+                result = step()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Ошибка при остановке ({name}): {e}")
     
     def is_admin(self, user_id: int) -> bool:
         """Проверка, является ли пользователь администратором"""
@@ -17,6 +17,49 @@ ADMIN_IDS = [
 
 # Настройки базы данных
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///bot.db")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # секунды
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # секунды
+# Применять миграции схемы при запуске бота (для нескольких экземпляров на PostgreSQL
+# лучше отключить и выполнять python migrate.py отдельно)
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"
+# Профиль SQLite: default (без настроек), durable (WAL, полная синхронизация) или performance
+# (WAL, synchronous=NORMAL: при потере питания возможен откат последних транзакций)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+
+# Кэш пользователей
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))  # секунды
+
+# Интервал сброса буфера активности пользователей в базу (секунды)
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "5"))
+
+# Настройки архива сообщений
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+ARCHIVE_QUEUE_SIZE = int(os.getenv("ARCHIVE_QUEUE_SIZE", "10000"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_FLUSH_INTERVAL = float(os.getenv("ARCHIVE_FLUSH_INTERVAL", "2"))  # секунды
+ARCHIVE_OVERFLOW_POLICY = os.getenv("ARCHIVE_OVERFLOW_POLICY", "spill")  # drop, spill или block
+ARCHIVE_BLOCK_TIMEOUT = float(os.getenv("ARCHIVE_BLOCK_TIMEOUT", "0.5"))  # секунды
+ARCHIVE_SPILL_PATH = os.getenv("ARCHIVE_SPILL_PATH", "data/archive_spill.jsonl")
+
+# Хранение сообщений: срок в днях (0 - хранить всегда) и сроки для отдельных типов
+MESSAGE_RETENTION_DAYS = int(os.getenv("MESSAGE_RETENTION_DAYS", "90"))
+MESSAGE_RETENTION_BY_TYPE = {
+    message_type.strip(): int(days)
+    for message_type, days in (
+        item.split(":") for item in os.getenv("MESSAGE_RETENTION_BY_TYPE", "").split(",") if item.strip()
+    )
+}
+PRUNE_INTERVAL = float(os.getenv("PRUNE_INTERVAL", "3600"))  # секунды
+PRUNE_BATCH_SIZE = int(os.getenv("PRUNE_BATCH_SIZE", "1000"))
+PRUNE_BATCH_PAUSE = float(os.getenv("PRUNE_BATCH_PAUSE", "0.1"))  # секунды между пачками
+MESSAGE_COLD_ARCHIVE_PATH = os.getenv("MESSAGE_COLD_ARCHIVE_PATH", "data/archive/messages")
+
+# Конфигурация полнотекстового поиска
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "10"))
 
 # Настройки логирования
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -40,14 +83,105 @@ REDIS_URL = os.getenv("REDIS_URL", "")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "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")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "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")
 
-# Настройки AI сервисов
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
-GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+# Настройки AI сервисов (адреса можно направить на локальную заглушку benchmarks/ai_stub.py)
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
+GEMINI_BASE_URL = os.getenv(
+    "GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models"
+).rstrip("/")
+
+# Цепочки моделей в порядке приоритета (через запятую)
+OPENROUTER_MODELS = [
+    model.strip()
+    for model in os.getenv("OPENROUTER_MODELS", "anthropic/claude-3.5-sonnet").split(",")
+    if model.strip()
+]
+GEMINI_MODELS = [
+    model.strip()
+    for model in os.getenv("GEMINI_MODELS", "gemini-2.0-flash-exp").split(",")
+    if model.strip()
+]
+
+# Маршрутизация по моделям
+AI_BREAKER_THRESHOLD = int(os.getenv("AI_BREAKER_THRESHOLD", "5"))  # ошибок подряд до исключения модели
+AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "30"))  # секунды до пробного запроса
+AI_LATENCY_WINDOW = int(os.getenv("AI_LATENCY_WINDOW", "100"))  # последних замеров для p95
+AI_LATENCY_MIN_SAMPLES = int(os.getenv("AI_LATENCY_MIN_SAMPLES", "20"))  # замеров до учета p95
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "false").lower() == "true"
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "3.0"))  # секунды до запроса к резервной модели
+
+# Цены моделей для оценки расходов: "модель=вход:выход" через запятую, USD за 1M токенов
+AI_MODEL_PRICES = {}
+for item in os.getenv("AI_MODEL_PRICES", "anthropic/claude-3.5-sonnet=3:15").split(","):
+    if "=" in item:
+        model, prices = item.rsplit("=", 1)
+        prompt_price, _, completion_price = prices.partition(":")
+        AI_MODEL_PRICES[model.strip()] = (float(prompt_price or 0), float(completion_price or 0))
+
+# Дневная квота токенов AI на пользователя (0 - без ограничения, администраторы не ограничены)
+AI_USER_DAILY_TOKENS = int(os.getenv("AI_USER_DAILY_TOKENS", "0"))
+
+# Настройки HTTP-клиента AI сервисов
+AI_HTTP_POOL_SIZE = int(os.getenv("AI_HTTP_POOL_SIZE", "100"))  # всего соединений
+AI_HTTP_POOL_PER_HOST = int(os.getenv("AI_HTTP_POOL_PER_HOST", "20"))
+AI_HTTP_DNS_TTL = int(os.getenv("AI_HTTP_DNS_TTL", "300"))  # секунды
+AI_HTTP_KEEPALIVE = float(os.getenv("AI_HTTP_KEEPALIVE", "60"))  # секунды
+AI_HTTP_TIMEOUT = float(os.getenv("AI_HTTP_TIMEOUT", "60"))  # секунды на весь запрос
+AI_HTTP_CONNECT_TIMEOUT = float(os.getenv("AI_HTTP_CONNECT_TIMEOUT", "10"))  # секунды
+
+# Кэш ответов AI (REDIS_URL включает общий кэш между экземплярами)
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "true").lower() == "true"
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "5000"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "3600"))  # секунды
+AI_CACHE_MAX_MB = float(os.getenv("AI_CACHE_MAX_MB", "32"))
+
+# Планировщик запросов к AI
+AI_TEXT_CONCURRENCY = int(os.getenv("AI_TEXT_CONCURRENCY", "8"))  # параллельных текстовых запросов
+AI_IMAGE_CONCURRENCY = int(os.getenv("AI_IMAGE_CONCURRENCY", "3"))  # параллельных запросов анализа изображений
+AI_QUEUE_SIZE = int(os.getenv("AI_QUEUE_SIZE", "50"))  # ожидающих запросов в пуле
+AI_QUEUE_PER_USER = int(os.getenv("AI_QUEUE_PER_USER", "2"))  # ожидающих запросов одного пользователя
+AI_TEXT_DEADLINE = float(os.getenv("AI_TEXT_DEADLINE", "45"))  # секунды на текстовый запрос с учетом очереди
+AI_IMAGE_DEADLINE = float(os.getenv("AI_IMAGE_DEADLINE", "90"))  # секунды на анализ изображения с учетом очереди
+
+# Память разговора (контекст для AI); хранится в памяти процесса и сбрасывается при перезапуске.
+# Выключена по умолчанию: ответы с контекстом не берутся из кэша AI и не объединяются
+CONVERSATION_ENABLED = os.getenv("CONVERSATION_ENABLED", "false").lower() == "true"
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "600"))  # токенов истории на пользователя
+CONVERSATION_MAX_TURN_CHARS = int(os.getenv("CONVERSATION_MAX_TURN_CHARS", "500"))  # символов в одной реплике
+CONVERSATION_IDLE_TTL = float(os.getenv("CONVERSATION_IDLE_TTL", "1800"))  # секунды неактивности до удаления
+CONVERSATION_MAX_USERS = int(os.getenv("CONVERSATION_MAX_USERS", "10000"))  # разговоров в памяти
+
+# Потоковые ответы AI
+AI_STREAMING_ENABLED = os.getenv("AI_STREAMING_ENABLED", "true").lower() == "true"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # секунды между правками сообщения
+STREAM_MIN_DELTA = int(os.getenv("STREAM_MIN_DELTA", "20"))  # минимум новых символов для правки
+
+# Подготовка изображений для AI
+IMAGE_TARGET_SIDE = int(os.getenv("IMAGE_TARGET_SIDE", "1024"))  # пикселей по большей стороне
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_RECOMPRESS_MIN_KB = int(os.getenv("IMAGE_RECOMPRESS_MIN_KB", "512"))  # пересжимать изображения больше
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))  # потоков для перекодирования
+
+# Альбомы: ожидание остальных частей после последней полученной (секунды)
+MEDIA_GROUP_WINDOW = float(os.getenv("MEDIA_GROUP_WINDOW", "1.0"))
+
+# Кэш анализа изображений
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "50000"))  # записей в базе
+IMAGE_CACHE_MEMORY_SIZE = int(os.getenv("IMAGE_CACHE_MEMORY_SIZE", "2000"))  # записей в памяти
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", "86400"))  # секунды в памяти
+
+# Таблица намерений с готовыми ответами (без обращения к AI)
+INTENTS_FILE = os.getenv("INTENTS_FILE") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "handlers", "intents.json"
+)
 
 # Настройки файлов
 UPLOAD_PATH = os.getenv("UPLOAD_PATH", "uploads")
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "50"))  # MB
 
+# Настройки выгрузки данных (export.py)
+EXPORT_PATH = os.getenv("EXPORT_PATH", "exports")
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
 # Настройки безопасности
 ALLOWED_EXTENSIONS = [".jpg", ".jpeg", ".png", ".gif", ".mp4", ".pdf", ".doc", ".docx"]
 MAX_MESSAGE_LENGTH = int(os.getenv("MAX_MESSAGE_LENGTH", "4096"))
@@ -61,3 +195,7 @@ NOTIFICATION_CHAT_ID = os.getenv("NOTIFICATION_CHAT_ID", "")
 
 # Настройки статистики
 ENABLE_STATISTICS = os.getenv("ENABLE_STATISTICS", "true").lower() == "true"
+STATS_ROLLUP_INTERVAL = float(os.getenv("STATS_ROLLUP_INTERVAL", "300"))  # секунды
+STATS_ROLLUP_MAX_HOURS = int(os.getenv("STATS_ROLLUP_MAX_HOURS", "168"))  # часов за один проход
+# Час агрегируется только через столько секунд после окончания: сообщения из очереди архива успевают записаться
+STATS_ROLLUP_LAG = float(os.getenv("STATS_ROLLUP_LAG", "600"))
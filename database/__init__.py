@@ -2,13 +2,22 @@
 Модуль для работы с базой данных
 """
 
-from .models import init_database, User, get_user_by_id, create_user, update_user_activity, increment_message_count
+from .models import init_database, close_database, User, UserSnapshot, user_cache, get_user_by_id, create_user, register_user, update_user_activity, increment_message_count, iter_chunks, iter_users, iter_active_users, count_users, count_active_users
 
 __all__ = [
     "init_database",
+    "close_database",
     "User", 
+    "UserSnapshot",
+    "user_cache",
     "get_user_by_id", 
     "create_user", 
+    "register_user",
     "update_user_activity", 
-    "increment_message_count"
+    "increment_message_count",
+    "iter_chunks",
+    "iter_users",
+    "iter_active_users",
+    "count_users",
+    "count_active_users"
 ]
@@ -0,0 +1,113 @@
+"""
+Отложенная (write-behind) запись активности пользователей
+"""
+
+import asyncio
+from datetime import datetime
+from sqlalchemy import update, bindparam
+from loguru import logger
+
+from config import ACTIVITY_FLUSH_INTERVAL
+from .models import write_engine, User, user_cache
+
+
+class ActivityBuffer:
+    """Буфер активности пользователей с периодическим сбросом в базу данных"""
+    
+    def __init__(self, flush_interval: float = ACTIVITY_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        # user_id -> [время последней активности, приращение счетчика сообщений]
+        self._pending: dict[int, list] = {}
+        self._lock = asyncio.Lock()
+        self._task = None
+    
+    def touch(self, user_id: int, messages: int = 0):
+        """Учет активности пользователя без обращения к базе данных"""
+        entry = self._pending.get(user_id)
+        if entry is None:
+            self._pending[user_id] = [datetime.now(), messages]
+        else:
+            entry[0] = datetime.now()
+            entry[1] += messages
+    
+    def pending(self, user_id: int) -> tuple:
+        """Еще не сброшенные данные пользователя: (last_activity, приращение сообщений)"""
+        entry = self._pending.get(user_id)
+        return (entry[0], entry[1]) if entry else (None, 0)
+    
+    async def flush(self) -> int:
+        """
+        Сброс накопленной активности одним пакетным UPDATE
+        
+        Returns:
+            Количество обновленных пользователей
+        """
+        async with self._lock:
+            if not self._pending:
+                return 0
+            
+            pending, self._pending = self._pending, {}
+            params = [
+                {"b_user_id": user_id, "b_last_activity": last_activity, "b_messages": messages}
+                for user_id, (last_activity, messages) in pending.items()
+            ]
+            
+            users = User.__table__
+            stmt = (
+                update(users)
+                .where(users.c.user_id == bindparam("b_user_id"))
+                .values(
+                    last_activity=bindparam("b_last_activity"),
+                    messages_count=users.c.messages_count + bindparam("b_messages")
+                )
+            )
+            
+            try:
+                async with write_engine.begin() as conn:
+                    await conn.execute(stmt, params)
+            except Exception as e:
+                logger.error(f"Ошибка при сбросе активности пользователей: {e}")
+                self._restore(pending)
+                return 0
+            
+            # Снимки в кэше устарели после обновления
+            user_cache.invalidate_many(pending.keys())
+            return len(params)
+    
+    def _restore(self, pending: dict):
+        """Возврат несброшенных данных в буфер, чтобы не потерять приращения"""
+        for user_id, (last_activity, messages) in pending.items():
+            entry = self._pending.get(user_id)
+            if entry is None:
+                self._pending[user_id] = [last_activity, messages]
+            else:
+                entry[1] += messages
+    
+    async def _run(self):
+        """Фоновый цикл периодического сброса"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+    
+    def start(self):
+        """Запуск фонового сброса"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Буфер активности запущен (интервал сброса: {self.flush_interval} с)")
+    
+    async def stop(self):
+        """Остановка фонового сброса с гарантированным финальным сбросом"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        flushed = await self.flush()
+        logger.info(f"Буфер активности остановлен, сброшено пользователей: {flushed}")
+
+
+# Создаем глобальный экземпляр
+activity_buffer = ActivityBuffer()
@@ -0,0 +1,261 @@
+"""
+Пакетная запись истории сообщений
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from typing import NamedTuple, Optional
+from loguru import logger
+
+from config import (
+    ARCHIVE_QUEUE_SIZE,
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_FLUSH_INTERVAL,
+    ARCHIVE_OVERFLOW_POLICY,
+    ARCHIVE_BLOCK_TIMEOUT,
+    ARCHIVE_SPILL_PATH
+)
+from .models import save_messages
+from .stats import stats_rollup
+
+
+class MessageRecord(NamedTuple):
+    """Легковесная запись сообщения для архива (порядок полей совпадает с MESSAGE_COLUMNS)"""
+    user_id: int
+    message_id: int
+    chat_id: int
+    message_type: str
+    content: Optional[str]
+    file_id: Optional[str]
+    created_at: datetime
+
+
+def record_from_message(message) -> MessageRecord:
+    """Создание записи архива из сообщения Telegram"""
+    file_id = None
+    
+    if message.text:
+        message_type = "command" if message.text.startswith("/") else "text"
+    elif message.photo:
+        message_type = "photo"
+        file_id = message.photo[-1].file_id
+    else:
+        message_type = "other"
+        for media_type in ("video", "document", "voice", "audio", "sticker", "animation", "video_note"):
+            media = getattr(message, media_type, None)
+            if media:
+                message_type = media_type
+                file_id = media.file_id
+                break
+    
+    return MessageRecord(
+        user_id=message.from_user.id,
+        message_id=message.message_id,
+        chat_id=message.chat.id,
+        message_type=message_type,
+        content=message.text or message.caption,
+        file_id=file_id,
+        created_at=datetime.now()
+    )
+
+
+class MessageArchive:
+    """Ограниченная очередь сообщений с фоновой пакетной записью в базу данных"""
+    
+    OVERFLOW_POLICIES = ("drop", "spill", "block")
+    
+    def __init__(
+        self,
+        queue_size: int = ARCHIVE_QUEUE_SIZE,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        flush_interval: float = ARCHIVE_FLUSH_INTERVAL,
+        overflow_policy: str = ARCHIVE_OVERFLOW_POLICY,
+        spill_path: str = ARCHIVE_SPILL_PATH
+    ):
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {overflow_policy}")
+        
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.spill_path = spill_path
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task = None
+        # Пачка, извлеченная из очереди, но еще не записанная
+        self._inflight: list = []
+        # Файл сброса и счетчик spilled меняются из рабочих потоков
+        self._spill_lock = threading.Lock()
+        
+        # Счетчики для мониторинга
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+    
+    async def enqueue(self, record: MessageRecord):
+        """Постановка записи в очередь без ожидания записи в базу"""
+        try:
+            self._queue.put_nowait(record)
+            return
+        except asyncio.QueueFull:
+            pass
+        
+        if self.overflow_policy == "block":
+            # Обратное давление: ждем место в очереди ограниченное время
+            try:
+                await asyncio.wait_for(self._queue.put(record), ARCHIVE_BLOCK_TIMEOUT)
+                return
+            except asyncio.TimeoutError:
+                pass
+        elif self.overflow_policy == "spill":
+            await asyncio.to_thread(self._spill, [record])
+            return
+        
+        self.dropped += 1
+        if self.dropped % 1000 == 1:
+            logger.warning(f"Очередь архива сообщений переполнена, отброшено сообщений: {self.dropped}")
+    
+    def _spill(self, records: list):
+        """Сброс записей в файл на диске (выполняется в отдельном потоке)"""
+        lines = []
+        for record in records:
+            data = record._asdict()
+            data["created_at"] = record.created_at.isoformat()
+            lines.append(json.dumps(data, ensure_ascii=False) + "\n")
+        
+        directory = os.path.dirname(self.spill_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        with self._spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+            self.spilled += len(records)
+    
+    def _load_spill(self) -> list:
+        """Чтение и удаление файла сброса (выполняется в отдельном потоке)"""
+        replay_path = self.spill_path + ".replay"
+        # Файл забирается целиком под блокировкой: идущий сброс не допишет в уже прочитанный файл
+        with self._spill_lock:
+            if os.path.exists(self.spill_path):
+                if os.path.exists(replay_path):
+                    # Файл .replay остается, если процесс упал во время дозаписи: присоединяем к нему
+                    with open(self.spill_path, encoding="utf-8") as source, open(replay_path, "a", encoding="utf-8") as target:
+                        shutil.copyfileobj(source, target)
+                    os.remove(self.spill_path)
+                else:
+                    os.replace(self.spill_path, replay_path)
+                self.spilled = 0
+            elif not os.path.exists(replay_path):
+                return []
+        
+        records = []
+        with open(replay_path, encoding="utf-8") as f:
+            for line in f:
+                data = json.loads(line)
+                data["created_at"] = datetime.fromisoformat(data["created_at"])
+                records.append(MessageRecord(**data))
+        os.remove(replay_path)
+        return records
+    
+    async def _write(self, batch: list):
+        """Запись пачки в базу; при ошибке пачка сохраняется на диск"""
+        try:
+            self.written += await save_messages(batch)
+        except Exception as e:
+            logger.error(f"Ошибка при пакетном сохранении сообщений: {e}")
+            await asyncio.to_thread(self._spill, batch)
+    
+    async def replay_spill(self):
+        """Дозапись сообщений, ранее сброшенных на диск"""
+        try:
+            records = await asyncio.to_thread(self._load_spill)
+        except Exception as e:
+            logger.error(f"Ошибка при чтении файла сброса архива: {e}")
+            return
+        
+        if not records:
+            return
+        
+        logger.info(f"Дозапись сообщений из файла сброса: {len(records)}")
+        for start in range(0, len(records), self.batch_size):
+            await self._write(records[start:start + self.batch_size])
+        
+        # Часы этих сообщений могли быть уже агрегированы
+        stats_rollup.invalidate(min(record.created_at for record in records))
+    
+    async def _collect_batch(self) -> list:
+        """Ожидание первой записи и добор пачки в пределах интервала сброса"""
+        loop = asyncio.get_running_loop()
+        batch = self._inflight = [await self._queue.get()]
+        deadline = loop.time() + self.flush_interval
+        
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    async def _run(self):
+        """Фоновый цикл записи"""
+        await self.replay_spill()
+        
+        while True:
+            batch = await self._collect_batch()
+            await self._write(batch)
+            self._inflight = []
+            
+            # Пока очередь пуста, дописываем сброшенное на диск
+            if self.spilled and self._queue.empty():
+                await self.replay_spill()
+    
+    def start(self):
+        """Запуск фоновой записи"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"Архив сообщений запущен (пачка: {self.batch_size}, "
+                f"политика переполнения: {self.overflow_policy})"
+            )
+    
+    async def stop(self):
+        """Остановка фоновой записи с дозаписью оставшейся очереди"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        batch, self._inflight = self._inflight, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+            if len(batch) >= self.batch_size:
+                await self._write(batch)
+                batch = []
+        if batch:
+            await self._write(batch)
+        
+        logger.info(
+            f"Архив сообщений остановлен (записано: {self.written}, "
+            f"отброшено: {self.dropped})"
+        )
+
+
+# Создаем глобальный экземпляр
+message_archive = MessageArchive()
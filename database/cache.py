@@ -0,0 +1,95 @@
+"""
+Кэши в памяти процесса
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+
+class TTLCache:
+    """LRU-кэш с ограничением размера (и, при необходимости, памяти) и временем жизни записей"""
+    
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 300.0,
+        max_bytes: int = 0,
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        # Лимит памяти учитывается, только если задана функция оценки размера значения
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        # key -> (время истечения, значение, размер); порядок - от давно использованных к недавним
+        self._data: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получение значения с обновлением его позиции в LRU"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        
+        expires_at, value, _ = item
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return default
+        
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Сохранение значения с вытеснением самых старых записей"""
+        self._remove(key)
+        size = self.sizeof(value) if self.sizeof else 0
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, size)
+        self._bytes += size
+        
+        while len(self._data) > self.max_size or (self.max_bytes and self._bytes > self.max_bytes and len(self._data) > 1):
+            _, (_, _, evicted_size) = self._data.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+    
+    def _remove(self, key: Hashable):
+        """Удаление записи с учетом занимаемой памяти"""
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+    
+    def invalidate(self, key: Hashable):
+        """Удаление записи из кэша"""
+        self._remove(key)
+    
+    def invalidate_many(self, keys: Iterable[Hashable]):
+        """Удаление нескольких записей из кэша"""
+        for key in keys:
+            self._remove(key)
+    
+    def clear(self):
+        """Очистка кэша"""
+        self._data.clear()
+        self._bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
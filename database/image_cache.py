@@ -0,0 +1,141 @@
+"""
+Кэш результатов анализа изображений
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from loguru import logger
+
+from config import IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_MEMORY_SIZE, IMAGE_CACHE_TTL
+from .cache import TTLCache
+from .models import SessionLocal, WriteSessionLocal, ImageAnalysis, write_engine
+
+
+def content_hash(data) -> str:
+    """SHA-256 содержимого изображения"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def prompt_hash(prompt: str) -> str:
+    """Хэш промпта: один и тот же файл с разными промптами кэшируется отдельно"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class ImageAnalysisCache:
+    """
+    Кэш анализа изображений по file_unique_id Telegram с запасным ключом по хэшу содержимого
+    
+    Горячие записи хранятся в памяти, все записи - в таблице image_analyses
+    (переживают перезапуск), размер таблицы ограничен IMAGE_CACHE_MAX_ENTRIES.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = IMAGE_CACHE_MAX_ENTRIES,
+        memory_size: int = IMAGE_CACHE_MEMORY_SIZE,
+        ttl: float = IMAGE_CACHE_TTL
+    ):
+        self.max_entries = max_entries
+        self.local = TTLCache(max_size=memory_size, ttl=ttl)
+        self._inserts = 0
+    
+    async def _lookup(self, local_key: tuple, condition) -> Optional[str]:
+        """Поиск в памяти, затем в базе данных"""
+        analysis = self.local.get(local_key)
+        if analysis is not None:
+            return analysis
+        
+        async with SessionLocal() as db:
+            analysis = (await db.execute(
+                select(ImageAnalysis.analysis).where(*condition).limit(1)
+            )).scalar()
+        
+        if analysis is not None:
+            self.local.set(local_key, analysis)
+        return analysis
+    
+    async def get(self, file_unique_id: str, prompt: str) -> Optional[str]:
+        """Анализ по file_unique_id (проверяется до скачивания файла)"""
+        key = prompt_hash(prompt)
+        return await self._lookup(
+            ("file", key, file_unique_id),
+            (ImageAnalysis.prompt_hash == key, ImageAnalysis.file_unique_id == file_unique_id)
+        )
+    
+    async def get_by_content(self, digest: str, prompt: str) -> Optional[str]:
+        """Анализ по хэшу содержимого (тот же файл, пересохраненный под другим file_unique_id)"""
+        key = prompt_hash(prompt)
+        return await self._lookup(
+            ("content", key, digest),
+            (ImageAnalysis.prompt_hash == key, ImageAnalysis.content_hash == digest)
+        )
+    
+    async def set(self, file_unique_id: str, digest: Optional[str], prompt: str, analysis: str):
+        """Сохранение результата анализа"""
+        key = prompt_hash(prompt)
+        self.local.set(("file", key, file_unique_id), analysis)
+        if digest:
+            self.local.set(("content", key, digest), analysis)
+        
+        values = dict(
+            file_unique_id=file_unique_id,
+            content_hash=digest,
+            prompt_hash=key,
+            analysis=analysis,
+            created_at=datetime.now()
+        )
+        try:
+            dialect = write_engine.dialect.name
+            if dialect in ("postgresql", "sqlite"):
+                # Один запрос без гонки: одновременные вызовы для одного файла не конфликтуют
+                dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+                stmt = dialect_insert(ImageAnalysis.__table__).values(**values).on_conflict_do_nothing(
+                    index_elements=["prompt_hash", "file_unique_id"]
+                )
+                async with write_engine.begin() as conn:
+                    inserted = (await conn.execute(stmt)).rowcount
+            else:
+                # Для прочих СУБД остается проверка перед вставкой
+                async with WriteSessionLocal() as db:
+                    exists = (await db.execute(
+                        select(ImageAnalysis.id).where(
+                            ImageAnalysis.prompt_hash == key,
+                            ImageAnalysis.file_unique_id == file_unique_id
+                        )
+                    )).scalar()
+                    inserted = 0
+                    if exists is None:
+                        db.add(ImageAnalysis(**values))
+                        await db.commit()
+                        inserted = 1
+            self._inserts += inserted
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении анализа изображения: {e}")
+            return
+        
+        # Проверяем размер таблицы не на каждой вставке
+        if self._inserts >= 100:
+            self._inserts = 0
+            await self.prune()
+    
+    async def prune(self) -> int:
+        """Удаление самых старых записей сверх лимита"""
+        async with WriteSessionLocal() as db:
+            total = (await db.execute(select(func.count()).select_from(ImageAnalysis))).scalar_one()
+            excess = total - self.max_entries
+            if excess <= 0:
+                return 0
+            
+            oldest = select(ImageAnalysis.id).order_by(ImageAnalysis.created_at, ImageAnalysis.id).limit(excess)
+            await db.execute(delete(ImageAnalysis).where(ImageAnalysis.id.in_(oldest)))
+            await db.commit()
+        
+        logger.info(f"Кэш анализа изображений: удалено старых записей {excess}")
+        return excess
+
+
+# Создаем глобальный экземпляр
+image_analysis_cache = ImageAnalysisCache()
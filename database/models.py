@@ -2,23 +2,138 @@
 Модели базы данных
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import asyncio
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Index, select, insert, text, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.sql import func
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import AsyncIterator, NamedTuple, Optional
 from loguru import logger
 
-from config import DATABASE_URL
+from config import (
+    DATABASE_URL,
+    DB_ECHO,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    SQLITE_PROFILE,
+    DB_AUTO_MIGRATE,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL
+)
+from .cache import TTLCache
+from .sqlite_profile import get_sqlite_pragmas, apply_sqlite_pragmas
+from .schema import get_head_revision, upgrade_database
 
 # Создаем базовый класс для моделей
 Base = declarative_base()
 
-# Создаем движок базы данных
-engine = create_engine(DATABASE_URL, echo=False)
 
-# Создаем фабрику сессий
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_async_database_url(database_url: str):
+    """Преобразование DATABASE_URL в URL с асинхронным драйвером"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if backend == "postgresql":
+        return url.set(drivername="postgresql+asyncpg")
+    
+    # Драйвер уже указан явно (например, mysql+aiomysql)
+    return url
+
+
+def is_sqlite_memory(url) -> bool:
+    """Является ли URL базой SQLite в памяти"""
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def get_engine_options(url, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW) -> dict:
+    """Параметры пула соединений для движка"""
+    options = {"echo": DB_ECHO}
+    
+    # Для SQLite в памяти используется StaticPool, параметры пула к нему не применимы
+    if is_sqlite_memory(url):
+        return options
+    
+    # aiosqlite по умолчанию использует NullPool и открывает файл заново на каждую сессию
+    if url.get_backend_name() == "sqlite":
+        options["poolclass"] = AsyncAdaptedQueuePool
+    
+    options.update(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=url.get_backend_name() != "sqlite"
+    )
+    return options
+
+
+def _install_sqlite_pragmas(async_engine, pragmas: dict):
+    """Применение PRAGMA профиля к каждому новому соединению движка"""
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+
+def create_engines(database_url: str, sqlite_profile: str = SQLITE_PROFILE) -> tuple:
+    """
+    Создание движков для чтения и для записи
+    
+    Для SQLite в режиме WAL запись идет через единственное выделенное соединение
+    (писатели не конкурируют за блокировку), а чтение - через обычный пул параллельно.
+    Для остальных СУБД оба движка совпадают.
+    
+    Args:
+        database_url: DATABASE_URL
+        sqlite_profile: Профиль SQLite из SQLITE_PROFILES
+        
+    Returns:
+        (движок для чтения, движок для записи)
+    """
+    url = get_async_database_url(database_url)
+    read_engine = create_async_engine(url, **get_engine_options(url))
+    
+    if url.get_backend_name() != "sqlite" or is_sqlite_memory(url):
+        return read_engine, read_engine
+    
+    pragmas = get_sqlite_pragmas(sqlite_profile)
+    _install_sqlite_pragmas(read_engine, pragmas)
+    
+    # Без WAL читатели блокируют писателя, отдельное соединение для записи ничего не дает
+    if str(pragmas.get("journal_mode", "")).upper() != "WAL":
+        return read_engine, read_engine
+    
+    write_engine = create_async_engine(url, **get_engine_options(url, pool_size=1, max_overflow=0))
+    _install_sqlite_pragmas(write_engine, pragmas)
+    return read_engine, write_engine
+
+
+def create_session_factory(bind) -> async_sessionmaker:
+    """Фабрика асинхронных сессий для движка"""
+    return async_sessionmaker(
+        bind=bind,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    )
+
+
+# Создаем асинхронные движки базы данных
+engine, write_engine = create_engines(DATABASE_URL)
+
+# Создаем фабрики асинхронных сессий для чтения и для записи
+SessionLocal = create_session_factory(engine)
+WriteSessionLocal = create_session_factory(write_engine)
+
+# Кэш снимков пользователей по user_id
+user_cache = TTLCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
 
 
 class User(Base):
@@ -32,154 +147,391 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
     messages_count = Column(Integer, default=0)
-    created_at = Column(DateTime, default=func.now())
-    last_activity = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=func.now(), index=True)
+    last_activity = Column(DateTime, default=func.now(), index=True)
     language_code = Column(String(10), default="ru")
     settings = Column(Text, nullable=True)  # JSON строка с настройками
 
 
+class UserSnapshot(NamedTuple):
+    """Неизменяемый снимок пользователя, отвязанный от сессии"""
+    id: int
+    user_id: int
+    username: Optional[str]
+    full_name: str
+    is_active: bool
+    is_admin: bool
+    messages_count: int
+    created_at: datetime
+    last_activity: datetime
+    language_code: Optional[str]
+    settings: Optional[str]
+    
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        """Создание снимка из ORM-объекта или строки результата запроса"""
+        return cls(*(getattr(user, field) for field in cls._fields))
+
+
 class Message(Base):
     """Модель сообщения"""
     __tablename__ = "messages"
+    __table_args__ = (
+        # История сообщений пользователя и удаление устаревших сообщений по типу
+        Index("ix_messages_user_id_created_at", "user_id", "created_at"),
+        Index("ix_messages_message_type_created_at", "message_type", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False)
     message_id = Column(Integer, nullable=False)
-    chat_id = Column(Integer, nullable=False)
+    chat_id = Column(Integer, nullable=False, index=True)
     message_type = Column(String(50), nullable=False)  # text, photo, video, etc.
     content = Column(Text, nullable=True)
     file_id = Column(String(255), nullable=True)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=func.now(), index=True)
 
 
 class Statistics(Base):
     """Модель статистики"""
     __tablename__ = "statistics"
+    __table_args__ = (
+        Index("ix_statistics_period_date", "period", "date", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime, default=func.now())
+    period = Column(String(10), default="day")  # hour или day
+    date = Column(DateTime, default=func.now())  # начало периода
     total_users = Column(Integer, default=0)
+    new_users = Column(Integer, default=0)
     active_users = Column(Integer, default=0)
     total_messages = Column(Integer, default=0)
     commands_used = Column(Text, nullable=True)  # JSON строка
 
 
+class ImageAnalysis(Base):
+    """Результат AI анализа изображения (кэш по file_unique_id и хэшу содержимого)"""
+    __tablename__ = "image_analyses"
+    __table_args__ = (
+        Index("ix_image_analyses_prompt_file", "prompt_hash", "file_unique_id", unique=True),
+        Index("ix_image_analyses_prompt_content", "prompt_hash", "content_hash"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    file_unique_id = Column(String(128), nullable=False)
+    content_hash = Column(String(64), nullable=True)
+    prompt_hash = Column(String(64), nullable=False)
+    analysis = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=func.now(), index=True)
+
+
+async def get_schema_version() -> Optional[str]:
+    """Текущая версия схемы из alembic_version (None, если миграции еще не применялись)"""
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+    except Exception:
+        return None
+
+
 async def init_database():
-    """Инициализация базы данных"""
+    """Инициализация базы данных: быстрая проверка версии схемы вместо create_all"""
     try:
-        # Создаем все таблицы
-        Base.metadata.create_all(bind=engine)
+        # Один запрос к alembic_version; рефлексия таблиц не выполняется
+        version = await get_schema_version()
+        head = get_head_revision()
+        if version == head:
+            logger.info(f"База данных инициализирована успешно (схема {version})")
+            return
+        
+        if not DB_AUTO_MIGRATE:
+            raise RuntimeError(
+                f"Схема базы данных устарела ({version or 'нет'} -> {head}). "
+                "Выполните миграцию: python migrate.py"
+            )
+        
+        logger.info(f"Миграция схемы базы данных: {version or 'нет'} -> {head}")
+        await asyncio.to_thread(upgrade_database)
         logger.info("База данных инициализирована успешно")
     except Exception as e:
         logger.error(f"Ошибка при инициализации базы данных: {e}")
         raise
 
 
-def get_db():
+# Язык полнотекстового поиска PostgreSQL; совпадает с языком индекса ix_messages_content_fts
+# из миграции 0002, поэтому не настраивается: смена языка требует новой миграции
+FTS_LANGUAGE = "russian"
+
+
+def postgres_fts_vector() -> str:
+    """Выражение tsvector; запросы должны использовать его без изменений, иначе индекс не применится"""
+    return f"to_tsvector('{FTS_LANGUAGE}', coalesce(content, ''))"
+
+
+async def close_database():
+    """Закрытие соединений с базой данных"""
+    await engine.dispose()
+    if write_engine is not engine:
+        await write_engine.dispose()
+    logger.info("Соединения с базой данных закрыты")
+
+
+async def get_db():
     """Получение сессии базы данных"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-async def get_user_by_id(user_id: int) -> User:
-    """Получение пользователя по ID"""
-    db = SessionLocal()
-    try:
-        return db.query(User).filter(User.user_id == user_id).first()
-    finally:
-        db.close()
+async def get_user_by_id(user_id: int) -> Optional[UserSnapshot]:
+    """Получение пользователя по ID (через кэш)"""
+    snapshot = user_cache.get(user_id)
+    if snapshot is not None:
+        return snapshot
+    
+    async with SessionLocal() as db:
+        result = await db.execute(select(User).where(User.user_id == user_id))
+        user = result.scalars().first()
+    
+    if user is None:
+        return None
+    
+    snapshot = UserSnapshot.from_user(user)
+    user_cache.set(user_id, snapshot)
+    return snapshot
 
 
-async def create_user(user_id: int, full_name: str, username: str = None) -> User:
+async def create_user(user_id: int, full_name: str, username: str = None) -> UserSnapshot:
     """Создание нового пользователя"""
-    db = SessionLocal()
-    try:
-        user = User(
+    async with WriteSessionLocal() as db:
+        try:
+            user = User(
+                user_id=user_id,
+                full_name=full_name,
+                username=username
+            )
+            db.add(user)
+            await db.commit()
+            await db.refresh(user)
+            user_cache.invalidate(user_id)
+            return UserSnapshot.from_user(user)
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Ошибка при создании пользователя: {e}")
+            raise
+
+
+async def register_user(user_id: int, full_name: str, username: str = None) -> tuple[UserSnapshot, bool]:
+    """
+    Регистрация пользователя одним запросом INSERT ... ON CONFLICT
+    
+    Создает пользователя или обновляет имя, username и время активности существующего.
+    
+    Args:
+        user_id: Telegram ID пользователя
+        full_name: Полное имя
+        username: Username
+        
+    Returns:
+        Снимок пользователя и признак того, что пользователь новый
+    """
+    now = datetime.now()
+    users = User.__table__
+    
+    dialect = write_engine.dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        # Для прочих СУБД остается путь из двух запросов
+        user = await get_user_by_id(user_id)
+        if user:
+            return user, False
+        return await create_user(user_id, full_name, username), True
+    
+    async with write_engine.begin() as conn:
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(users).values(
             user_id=user_id,
             full_name=full_name,
-            username=username
+            username=username,
+            created_at=now,
+            last_activity=now
         )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        return user
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Ошибка при создании пользователя: {e}")
-        raise
-    finally:
-        db.close()
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[users.c.user_id],
+            set_={
+                "full_name": stmt.excluded.full_name,
+                "username": stmt.excluded.username,
+                "last_activity": stmt.excluded.last_activity
+            }
+        ).returning(*users.c)
+        
+        row = (await conn.execute(stmt)).one()
+    
+    # created_at при конфликте не обновляется, поэтому совпадает с now только у новой записи
+    snapshot = UserSnapshot.from_user(row)
+    user_cache.set(user_id, snapshot)
+    return snapshot, row.created_at == now
 
 
 async def update_user_activity(user_id: int):
     """Обновление времени последней активности пользователя"""
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.user_id == user_id).first()
-        if user:
-            user.last_activity = datetime.now()
-            db.commit()
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Ошибка при обновлении активности пользователя: {e}")
-    finally:
-        db.close()
+    async with WriteSessionLocal() as db:
+        try:
+            result = await db.execute(select(User).where(User.user_id == user_id))
+            user = result.scalars().first()
+            if user:
+                user.last_activity = datetime.now()
+                await db.commit()
+                user_cache.invalidate(user_id)
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Ошибка при обновлении активности пользователя: {e}")
 
 
 async def increment_message_count(user_id: int):
     """Увеличение счетчика сообщений пользователя"""
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.user_id == user_id).first()
-        if user:
-            user.messages_count += 1
-            db.commit()
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Ошибка при увеличении счетчика сообщений: {e}")
-    finally:
-        db.close()
+    async with WriteSessionLocal() as db:
+        try:
+            result = await db.execute(select(User).where(User.user_id == user_id))
+            user = result.scalars().first()
+            if user:
+                user.messages_count += 1
+                await db.commit()
+                user_cache.invalidate(user_id)
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Ошибка при увеличении счетчика сообщений: {e}")
 
 
-async def get_all_users() -> list[User]:
-    """Получение всех пользователей"""
-    db = SessionLocal()
-    try:
-        return db.query(User).all()
-    finally:
-        db.close()
+async def iter_chunks(stmt, key_column, chunk_size: int = 1000, after: int = 0) -> AsyncIterator[list]:
+    """
+    Постраничный обход выборки по возрастающему ключу (keyset pagination)
+    
+    Каждая порция читается отдельной короткой транзакцией через пул чтения, поэтому
+    память не зависит от размера таблицы, а соединение не удерживается между порциями.
+    
+    Args:
+        stmt: Выборка, содержащая key_column
+        key_column: Уникальная колонка-ключ (обычно id)
+        chunk_size: Размер порции
+        after: Значение ключа, после которого начинается обход
+        
+    Yields:
+        Порции строк, упорядоченные по ключу
+    """
+    last_key = after
+    while True:
+        async with engine.connect() as conn:
+            rows = (await conn.execute(
+                stmt.where(key_column > last_key).order_by(key_column).limit(chunk_size)
+            )).all()
+        
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            break
+        last_key = getattr(rows[-1], key_column.key)
 
 
-async def get_active_users() -> list[User]:
-    """Получение активных пользователей (активность за последние 24 часа)"""
-    db = SessionLocal()
-    try:
-        from datetime import timedelta
-        yesterday = datetime.now() - timedelta(days=1)
-        return db.query(User).filter(User.last_activity >= yesterday).all()
-    finally:
-        db.close()
+# Колонки, выбираемые при потоковом обходе пользователей по умолчанию
+USER_ITER_COLUMNS = (User.user_id, User.username, User.full_name, User.language_code)
+
+
+async def iter_users(
+    chunk_size: int = 1000,
+    active_since: Optional[datetime] = None,
+    columns: tuple = USER_ITER_COLUMNS
+) -> AsyncIterator:
+    """
+    Потоковый обход пользователей порциями по id (см. iter_chunks)
+    
+    Args:
+        chunk_size: Размер порции
+        active_since: Только пользователи, активные начиная с этого момента
+        columns: Выбираемые колонки (id добавляется всегда)
+        
+    Yields:
+        Строки результата с колонкой id и запрошенными колонками
+    """
+    columns = [column for column in columns if column is not User.id]
+    stmt = select(User.id, *columns)
+    if active_since is not None:
+        stmt = stmt.where(User.last_activity >= active_since)
+    
+    async for rows in iter_chunks(stmt, User.id, chunk_size=chunk_size):
+        for row in rows:
+            yield row
+
+
+async def iter_active_users(hours: int = 24, chunk_size: int = 1000, columns: tuple = USER_ITER_COLUMNS) -> AsyncIterator:
+    """Потоковый обход пользователей, активных за последние hours часов"""
+    since = datetime.now() - timedelta(hours=hours)
+    async for row in iter_users(chunk_size=chunk_size, active_since=since, columns=columns):
+        yield row
+
+
+async def count_users(active_since: Optional[datetime] = None) -> int:
+    """Количество пользователей без загрузки строк"""
+    stmt = select(func.count()).select_from(User)
+    if active_since is not None:
+        stmt = stmt.where(User.last_activity >= active_since)
+    
+    async with SessionLocal() as db:
+        return (await db.execute(stmt)).scalar_one()
+
+
+async def count_active_users(hours: int = 24) -> int:
+    """Количество пользователей, активных за последние hours часов"""
+    return await count_users(active_since=datetime.now() - timedelta(hours=hours))
 
 
 async def save_message(user_id: int, message_id: int, chat_id: int, message_type: str, content: str = None, file_id: str = None):
     """Сохранение сообщения в базу данных"""
-    db = SessionLocal()
-    try:
-        message = Message(
-            user_id=user_id,
-            message_id=message_id,
-            chat_id=chat_id,
-            message_type=message_type,
-            content=content,
-            file_id=file_id
-        )
-        db.add(message)
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Ошибка при сохранении сообщения: {e}")
-    finally:
-        db.close()
+    async with WriteSessionLocal() as db:
+        try:
+            message = Message(
+                user_id=user_id,
+                message_id=message_id,
+                chat_id=chat_id,
+                message_type=message_type,
+                content=content,
+                file_id=file_id
+            )
+            db.add(message)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Ошибка при сохранении сообщения: {e}")
+
+
+# Колонки таблицы messages в порядке, используемом при пакетной вставке
+MESSAGE_COLUMNS = ("user_id", "message_id", "chat_id", "message_type", "content", "file_id", "created_at")
+
+
+async def save_messages(records: list) -> int:
+    """
+    Пакетное сохранение сообщений
+    
+    Args:
+        records: Кортежи значений в порядке MESSAGE_COLUMNS
+        
+    Returns:
+        Количество сохраненных сообщений
+    """
+    if not records:
+        return 0
+    
+    async with write_engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # На PostgreSQL используем COPY - самый быстрый способ массовой вставки
+            raw_connection = await conn.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                Message.__tablename__,
+                records=[tuple(record) for record in records],
+                columns=MESSAGE_COLUMNS
+            )
+        else:
+            await conn.execute(
+                insert(Message.__table__),
+                [dict(zip(MESSAGE_COLUMNS, record)) for record in records]
+            )
+    
+    return len(records)
@@ -0,0 +1,156 @@
+"""
+Удаление устаревших сообщений с выгрузкой в холодный архив
+"""
+
+import asyncio
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, and_
+from loguru import logger
+
+from config import (
+    MESSAGE_RETENTION_DAYS,
+    MESSAGE_RETENTION_BY_TYPE,
+    PRUNE_INTERVAL,
+    PRUNE_BATCH_SIZE,
+    PRUNE_BATCH_PAUSE,
+    MESSAGE_COLD_ARCHIVE_PATH
+)
+from .models import engine, write_engine, Message
+
+
+class MessageRetention:
+    """Фоновое удаление сообщений небольшими пачками по сроку хранения для каждого типа"""
+    
+    def __init__(
+        self,
+        default_days: int = MESSAGE_RETENTION_DAYS,
+        days_by_type: dict = MESSAGE_RETENTION_BY_TYPE,
+        interval: float = PRUNE_INTERVAL,
+        batch_size: int = PRUNE_BATCH_SIZE,
+        batch_pause: float = PRUNE_BATCH_PAUSE,
+        archive_path: str = MESSAGE_COLD_ARCHIVE_PATH
+    ):
+        self.default_days = default_days
+        self.days_by_type = dict(days_by_type)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.archive_path = archive_path
+        self._task = None
+    
+    @property
+    def enabled(self) -> bool:
+        """Задан ли хотя бы один срок хранения"""
+        return self.default_days > 0 or any(days > 0 for days in self.days_by_type.values())
+    
+    def _conditions(self) -> list:
+        """Условия отбора устаревших сообщений для каждого правила хранения"""
+        now = datetime.now()
+        conditions = []
+        
+        for message_type, days in self.days_by_type.items():
+            if days > 0:
+                conditions.append(and_(
+                    Message.message_type == message_type,
+                    Message.created_at < now - timedelta(days=days)
+                ))
+        
+        if self.default_days > 0:
+            condition = Message.created_at < now - timedelta(days=self.default_days)
+            if self.days_by_type:
+                condition = and_(Message.message_type.notin_(list(self.days_by_type)), condition)
+            conditions.append(condition)
+        
+        return conditions
+    
+    def _export(self, rows: list):
+        """Дозапись удаляемых строк в сжатые файлы по датам (выполняется в отдельном потоке)"""
+        partitions: dict[str, list] = {}
+        for row in rows:
+            data = dict(row._mapping)
+            created_at = data["created_at"] or datetime.now()
+            data["created_at"] = created_at.isoformat()
+            partitions.setdefault(created_at.strftime("%Y/%m/messages-%Y-%m-%d"), []).append(data)
+        
+        for partition, items in partitions.items():
+            path = os.path.join(self.archive_path, partition + ".jsonl.gz")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Каждая дозапись - отдельный gzip-член, файл остается читаемым целиком
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                for item in items:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    
+    async def _prune_batch(self, condition) -> int:
+        """
+        Выгрузка и удаление одной пачки
+        
+        Пачка читается через пул чтения и выгружается до начала транзакции записи:
+        соединение записи занято только коротким DELETE по id.
+        """
+        messages = Message.__table__
+        async with engine.connect() as conn:
+            rows = (await conn.execute(
+                select(messages).where(condition).order_by(messages.c.id).limit(self.batch_size)
+            )).all()
+        if not rows:
+            return 0
+        
+        # Сначала архив, потом удаление: при сбое строка может попасть в архив дважды, но не потеряется
+        await asyncio.to_thread(self._export, rows)
+        async with write_engine.begin() as conn:
+            await conn.execute(delete(messages).where(messages.c.id.in_([row.id for row in rows])))
+        
+        return len(rows)
+    
+    async def prune(self) -> int:
+        """
+        Удаление всех устаревших сообщений
+        
+        Returns:
+            Количество удаленных сообщений
+        """
+        total = 0
+        for condition in self._conditions():
+            while True:
+                deleted = await self._prune_batch(condition)
+                total += deleted
+                if deleted < self.batch_size:
+                    break
+                # Пауза между пачками дает место записи новых сообщений
+                await asyncio.sleep(self.batch_pause)
+        
+        if total:
+            logger.info(f"Удалено устаревших сообщений: {total} (архив: {self.archive_path})")
+        return total
+    
+    async def _run(self):
+        """Фоновый цикл удаления"""
+        while True:
+            try:
+                await self.prune()
+            except Exception as e:
+                logger.error(f"Ошибка при удалении устаревших сообщений: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def start(self):
+        """Запуск фонового удаления"""
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Очистка сообщений запущена (интервал: {self.interval} с)")
+    
+    async def stop(self):
+        """Остановка фонового удаления"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Создаем глобальный экземпляр
+message_retention = MessageRetention()
@@ -0,0 +1,67 @@
+"""
+Версионирование схемы базы данных (Alembic)
+"""
+
+from pathlib import Path
+from typing import Optional
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import make_url
+from loguru import logger
+
+from config import DATABASE_URL
+
+# Корень проекта, где лежат alembic.ini и каталог migrations
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Ревизия, соответствующая схеме, созданной create_all до появления миграций
+BASELINE_REVISION = "0001"
+
+
+def get_sync_database_url(database_url: str = DATABASE_URL) -> str:
+    """URL с синхронным драйвером для Alembic"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    
+    if backend == "sqlite":
+        url = url.set(drivername="sqlite")
+    elif backend == "postgresql":
+        url = url.set(drivername="postgresql+psycopg2")
+    return url.render_as_string(hide_password=False)
+
+
+def get_alembic_config() -> Config:
+    """Конфигурация Alembic с путями проекта"""
+    config = Config(str(PROJECT_ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(PROJECT_ROOT / "migrations"))
+    # Логи идут через loguru, logging.fileConfig из alembic.ini не применяем
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def get_head_revision() -> Optional[str]:
+    """Последняя ревизия из файлов миграций (без обращения к базе данных)"""
+    return ScriptDirectory.from_config(get_alembic_config()).get_current_head()
+
+
+def upgrade_database(revision: str = "head"):
+    """
+    Применение миграций (синхронно, вызывается из migrate.py или в отдельном потоке)
+    
+    База, созданная до появления миграций, сначала помечается базовой ревизией.
+    """
+    config = get_alembic_config()
+    
+    engine = create_engine(get_sync_database_url())
+    try:
+        tables = set(inspect(engine).get_table_names())
+    finally:
+        engine.dispose()
+    
+    if "alembic_version" not in tables and "users" in tables:
+        logger.info(f"Схема без версии, помечаем базовой ревизией {BASELINE_REVISION}")
+        command.stamp(config, BASELINE_REVISION)
+    
+    command.upgrade(config, revision)
@@ -0,0 +1,95 @@
+"""
+Полнотекстовый поиск по истории сообщений
+"""
+
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import text, DateTime
+
+from .models import engine, postgres_fts_vector, FTS_LANGUAGE
+
+
+def build_fts5_query(query: str) -> str:
+    """
+    Преобразование пользовательского запроса в безопасный запрос FTS5
+    
+    Каждое слово берется в кавычки (спецсимволы FTS5 не интерпретируются),
+    слово со звездочкой на конце ищется по префиксу.
+    """
+    terms = []
+    for word in query.split():
+        is_prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*' if is_prefix else f'"{word}"')
+    return " ".join(terms)
+
+
+async def search_messages(
+    query: str,
+    user_id: Optional[int] = None,
+    chat_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = 10,
+    offset: int = 0
+) -> list:
+    """
+    Поиск сообщений по содержимому с ранжированием по релевантности
+    
+    Args:
+        query: Поисковый запрос
+        user_id: Фильтр по пользователю
+        chat_id: Фильтр по чату
+        date_from: Начало периода (включительно)
+        date_to: Конец периода (не включительно)
+        limit: Размер страницы
+        offset: Смещение
+        
+    Returns:
+        Строки с полями id, user_id, chat_id, message_type, created_at, snippet
+    """
+    params = {"limit": limit, "offset": offset}
+    filters = []
+    if user_id is not None:
+        filters.append("m.user_id = :user_id")
+        params["user_id"] = user_id
+    if chat_id is not None:
+        filters.append("m.chat_id = :chat_id")
+        params["chat_id"] = chat_id
+    if date_from is not None:
+        filters.append("m.created_at >= :date_from")
+        params["date_from"] = date_from
+    if date_to is not None:
+        filters.append("m.created_at < :date_to")
+        params["date_to"] = date_to
+    where = "".join(f" AND {condition}" for condition in filters)
+    
+    if engine.dialect.name == "postgresql":
+        params["query"] = query
+        sql = f"""
+            SELECT m.id, m.user_id, m.chat_id, m.message_type, m.created_at,
+                   left(m.content, 200) AS snippet,
+                   ts_rank({postgres_fts_vector()}, q) AS rank
+            FROM messages m, websearch_to_tsquery('{FTS_LANGUAGE}', :query) q
+            WHERE {postgres_fts_vector()} @@ q{where}
+            ORDER BY rank DESC, m.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+    else:
+        params["query"] = build_fts5_query(query)
+        if not params["query"]:
+            return []
+        sql = f"""
+            SELECT m.id, m.user_id, m.chat_id, m.message_type, m.created_at,
+                   snippet(messages_fts, 0, '[', ']', '…', 16) AS snippet,
+                   bm25(messages_fts) AS rank
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH :query{where}
+            ORDER BY rank, m.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+    
+    async with engine.connect() as conn:
+        return (await conn.execute(text(sql).columns(created_at=DateTime), params)).all()
@@ -0,0 +1,45 @@
+"""
+Профили производительности SQLite
+"""
+
+# Значения PRAGMA для каждого профиля.
+# WAL позволяет читателям работать параллельно с писателем и не блокирует их коммитами;
+# synchronous=NORMAL в режиме WAL сохраняет целостность базы при сбое процесса и ОС,
+# но при потере питания может откатить последние транзакции. Профиль durable
+# оставляет synchronous=FULL для полной долговечности каждого коммита.
+SQLITE_PROFILES = {
+    "default": {},
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,  # 64 MB (отрицательное значение - в килобайтах)
+        "mmap_size": 268435456,  # 256 MB
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+    },
+}
+
+
+def get_sqlite_pragmas(profile: str) -> dict:
+    """Значения PRAGMA для профиля"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(
+            f"Неизвестный профиль SQLite: {profile}. Доступны: {', '.join(SQLITE_PROFILES)}"
+        )
+    return SQLITE_PROFILES[profile]
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: dict):
+    """Применение PRAGMA к новому DBAPI-соединению"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
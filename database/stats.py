@@ -0,0 +1,285 @@
+"""
+Инкрементальные агрегаты статистики (по часам и по дням)
+"""
+
+import asyncio
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, delete, insert, func, literal_column
+from sqlalchemy.dialects import postgresql, sqlite
+from loguru import logger
+
+from config import STATS_ROLLUP_INTERVAL, STATS_ROLLUP_MAX_HOURS, STATS_ROLLUP_LAG
+from .models import engine, write_engine, SessionLocal, User, Message, Statistics
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+def truncate_hour(moment: datetime) -> datetime:
+    """Начало часа"""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def truncate_day(moment: datetime) -> datetime:
+    """Начало суток"""
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _hour_bucket(column, dialect: str):
+    """Выражение, округляющее время до начала часа"""
+    if dialect == "postgresql":
+        return func.date_trunc(literal_column("'hour'"), column)
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def _to_datetime(value) -> datetime:
+    """Приведение значения корзины к datetime (SQLite возвращает строку)"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _command_name(content: Optional[str]) -> Optional[str]:
+    """Имя команды из текста сообщения: '/start@bot payload' -> '/start'"""
+    if not content:
+        return None
+    return content.split(maxsplit=1)[0].split("@", 1)[0].lower()
+
+
+async def _upsert_statistics(conn, rows: list):
+    """
+    Запись строк статистики с обновлением существующих по (period, date)
+    
+    Пересчитанная строка сохраняет свой id, поэтому выгрузка по id
+    (export.py --since-last) не выгружает ее повторно.
+    """
+    table = Statistics.__table__
+    dialect = conn.dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        # Для прочих СУБД - удаление и вставка
+        for row in rows:
+            await conn.execute(delete(table).where(table.c.period == row["period"], table.c.date == row["date"]))
+        await conn.execute(insert(table), rows)
+        return
+    
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.period, table.c.date],
+        set_={
+            column: stmt.excluded[column]
+            for column in ("total_users", "new_users", "active_users", "total_messages", "commands_used")
+        }
+    )
+    await conn.execute(stmt, rows)
+
+
+class StatsRollup:
+    """
+    Фоновая агрегация статистики в таблицу statistics с продолжением от последней отметки
+    
+    Час агрегируется только через lag секунд после окончания, чтобы сообщения из
+    очереди архива успели записаться. Сообщения, записанные еще позже (дозапись
+    из файла сброса), отмечаются через invalidate, и их часы пересчитываются.
+    """
+    
+    def __init__(
+        self,
+        interval: float = STATS_ROLLUP_INTERVAL,
+        max_hours: int = STATS_ROLLUP_MAX_HOURS,
+        lag: float = STATS_ROLLUP_LAG
+    ):
+        self.interval = interval
+        self.max_hours = max_hours
+        self.lag = timedelta(seconds=lag)
+        self._task = None
+        # Самое раннее время сообщения, записанного после агрегации его часа
+        self._dirty_since: Optional[datetime] = None
+    
+    def invalidate(self, since: datetime):
+        """Пересчитать агрегаты начиная с часа since (для задним числом записанных сообщений)"""
+        if self._dirty_since is None or since < self._dirty_since:
+            self._dirty_since = since
+    
+    async def _next_hour(self, conn) -> Optional[datetime]:
+        """Первый еще не агрегированный час (после отметки или с первой регистрации)"""
+        watermark = (await conn.execute(
+            select(func.max(Statistics.date)).where(Statistics.period == "hour")
+        )).scalar()
+        if watermark is not None:
+            return _to_datetime(watermark) + HOUR
+        
+        first_user = (await conn.execute(select(func.min(User.created_at)))).scalar()
+        return truncate_hour(_to_datetime(first_user)) if first_user else None
+    
+    async def _hourly(self, conn, column, stmt, start: datetime, end: datetime, distinct=None) -> dict:
+        """Количество строк (или уникальных значений) по часам в диапазоне [start, end)"""
+        bucket = _hour_bucket(column, conn.dialect.name).label("bucket")
+        counter = func.count(func.distinct(distinct)) if distinct is not None else func.count()
+        rows = await conn.execute(
+            stmt.add_columns(bucket, counter.label("total"))
+            .where(column >= start, column < end)
+            .group_by(bucket)
+        )
+        return {_to_datetime(row.bucket): row.total for row in rows}
+    
+    async def rollup_once(self) -> int:
+        """
+        Агрегация закрытых часов после отметки (и помеченных invalidate) и пересчет затронутых суток
+        
+        Агрегаты считаются на пуле чтения; соединение записи занимается только
+        на запись готовых строк, чтобы долгий догоняющий проход не задерживал
+        остальные записи.
+        
+        Returns:
+            Количество агрегированных часов
+        """
+        ready_hour = truncate_hour(datetime.now() - self.lag)
+        dirty_since = self._dirty_since
+        resume = None
+        
+        async with engine.connect() as conn:
+            start = await self._next_hour(conn)
+            if start is None:
+                return 0
+            if dirty_since is not None and truncate_hour(dirty_since) < start:
+                # Пересчет уже агрегированных часов, затем продолжение с отметки
+                start, resume = truncate_hour(dirty_since), start
+            if start >= ready_hour:
+                return 0
+            end = min(ready_hour, start + self.max_hours * HOUR)
+            
+            new_users = await self._hourly(conn, User.created_at, select(), start, end)
+            messages = await self._hourly(conn, Message.created_at, select(), start, end)
+            active_users = await self._hourly(conn, Message.created_at, select(), start, end, distinct=Message.user_id)
+            total_before = (await conn.execute(
+                select(func.count()).select_from(User).where(User.created_at < start)
+            )).scalar_one()
+            
+            commands: dict[datetime, Counter] = {}
+            bucket = _hour_bucket(Message.created_at, conn.dialect.name).label("bucket")
+            rows = await conn.execute(
+                select(bucket, Message.content, func.count().label("total"))
+                .where(Message.message_type == "command", Message.created_at >= start, Message.created_at < end)
+                .group_by(bucket, Message.content)
+            )
+            for row in rows:
+                name = _command_name(row.content)
+                if name:
+                    commands.setdefault(_to_datetime(row.bucket), Counter())[name] += row.total
+            
+            hour_rows = []
+            total_users = total_before
+            hour = start
+            while hour < end:
+                total_users += new_users.get(hour, 0)
+                hour_rows.append({
+                    "period": "hour",
+                    "date": hour,
+                    "total_users": total_users,
+                    "new_users": new_users.get(hour, 0),
+                    "active_users": active_users.get(hour, 0),
+                    "total_messages": messages.get(hour, 0),
+                    "commands_used": json.dumps(dict(commands.get(hour, {})))
+                })
+                hour += HOUR
+            
+            days = sorted({truncate_day(row["date"]) for row in hour_rows})
+            day_rows = [await self._rollup_day(conn, day, hour_rows, start, end) for day in days]
+        
+        async with write_engine.begin() as conn:
+            await _upsert_statistics(conn, hour_rows + day_rows)
+        
+        if dirty_since is not None:
+            # Непересчитанный остаток; invalidate за время прохода могла отметить более ранний час
+            remaining = end if resume is not None and end < resume else None
+            if self._dirty_since is dirty_since:
+                self._dirty_since = remaining
+            elif remaining is not None:
+                self._dirty_since = min(self._dirty_since, remaining)
+        
+        logger.info(f"Статистика агрегирована: {len(hour_rows)} ч. ({start:%d.%m.%Y %H:%M} - {end:%d.%m.%Y %H:%M})")
+        return len(hour_rows)
+    
+    async def _rollup_day(self, conn, day: datetime, hour_rows: list, start: datetime, end: datetime) -> dict:
+        """Суточная строка из часовых: новых из hour_rows ([start, end)) и уже записанных остальных"""
+        day_end = day + DAY
+        stored = (await conn.execute(
+            select(Statistics.total_users, Statistics.new_users, Statistics.total_messages, Statistics.commands_used)
+            .where(
+                Statistics.period == "hour", Statistics.date >= day, Statistics.date < day_end,
+                (Statistics.date < start) | (Statistics.date >= end)
+            )
+        )).mappings().all()
+        hours = [row for row in hour_rows if day <= row["date"] < day_end] + list(stored)
+        
+        # Уникальных активных за сутки нельзя получить суммой часовых значений
+        active_users = (await conn.execute(
+            select(func.count(func.distinct(Message.user_id)))
+            .where(Message.created_at >= day, Message.created_at < day_end)
+        )).scalar_one()
+        
+        commands = Counter()
+        for row in hours:
+            commands.update(json.loads(row["commands_used"] or "{}"))
+        
+        return {
+            "period": "day",
+            "date": day,
+            "total_users": max(row["total_users"] for row in hours),
+            "new_users": sum(row["new_users"] for row in hours),
+            "active_users": active_users,
+            "total_messages": sum(row["total_messages"] for row in hours),
+            "commands_used": json.dumps(dict(commands))
+        }
+    
+    async def _run(self):
+        """Фоновый цикл агрегации"""
+        while True:
+            try:
+                # Догоняем пропущенные часы порциями, не дожидаясь интервала
+                while await self.rollup_once() >= self.max_hours:
+                    pass
+            except Exception as e:
+                logger.error(f"Ошибка при агрегации статистики: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def start(self):
+        """Запуск фоновой агрегации"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Агрегация статистики запущена (интервал: {self.interval} с)")
+    
+    async def stop(self):
+        """Остановка фоновой агрегации"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def get_latest_stats() -> tuple:
+    """
+    Последние агрегаты: суточная и часовая строки
+    
+    Returns:
+        (строка за сутки, строка за час) - каждая может быть None
+    """
+    async with SessionLocal() as db:
+        day = (await db.execute(
+            select(Statistics).where(Statistics.period == "day").order_by(Statistics.date.desc()).limit(1)
+        )).scalars().first()
+        hour = (await db.execute(
+            select(Statistics).where(Statistics.period == "hour").order_by(Statistics.date.desc()).limit(1)
+        )).scalars().first()
+    return day, hour
+
+
+# Создаем глобальный экземпляр
+stats_rollup = StatsRollup()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Потоковая выгрузка таблиц users, messages и statistics для аналитики
+
+Таблицы читаются порциями по id (память не зависит от размера таблиц, короткие
+транзакции не мешают записи бота) и пишутся в Parquet (если установлен pyarrow)
+или в сжатый CSV.
+
+Примеры:
+    python export.py
+    python export.py --tables messages --since-last
+    python export.py --format csv --since 01.10.2026 --output exports
+"""
+
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import select, Integer, Boolean, DateTime
+from loguru import logger
+
+from config import EXPORT_PATH, EXPORT_CHUNK_SIZE
+from database.models import close_database, iter_chunks, User, Message, Statistics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Таблица -> (модель, колонка даты для фильтра --since)
+EXPORT_TABLES = {
+    "users": (User, User.created_at),
+    "messages": (Message, Message.created_at),
+    "statistics": (Statistics, Statistics.date),
+}
+
+
+def arrow_schema(table):
+    """Схема Arrow по колонкам таблицы SQLAlchemy"""
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+class ParquetChunkWriter:
+    """Запись порций в один файл Parquet (каждая порция - отдельная группа строк)"""
+    
+    extension = ".parquet"
+    
+    def __init__(self, path: str, table):
+        self.schema = arrow_schema(table)
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+    
+    def write(self, rows: list):
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(self.schema.names)}
+        self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+    
+    def close(self):
+        self.writer.close()
+
+
+class CsvChunkWriter:
+    """Запись порций в сжатый CSV"""
+    
+    extension = ".csv.gz"
+    
+    def __init__(self, path: str, table):
+        self.file = gzip.open(path, "wt", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([column.name for column in table.columns])
+    
+    def write(self, rows: list):
+        self.writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+    
+    def close(self):
+        self.file.close()
+
+
+def load_state(path: str) -> dict:
+    """Последние выгруженные id по таблицам"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: dict):
+    """Сохранение отметок выгрузки (через временный файл, чтобы не повредить при сбое)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def export_table(name: str, writer_class, output: str, after_id: int, since, chunk_size: int) -> tuple:
+    """
+    Выгрузка одной таблицы порциями по id
+    
+    Returns:
+        (количество строк, последний выгруженный id)
+    """
+    model, date_column = EXPORT_TABLES[name]
+    table = model.__table__
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    directory = os.path.join(output, name)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}-{timestamp}{writer_class.extension}")
+    
+    writer = writer_class(path, table)
+    total, last_id = 0, after_id
+    try:
+        stmt = select(table)
+        if since is not None:
+            stmt = stmt.where(date_column >= since)
+        
+        async for rows in iter_chunks(stmt, table.c.id, chunk_size=chunk_size, after=after_id):
+            writer.write(rows)
+            total += len(rows)
+            last_id = rows[-1].id
+    finally:
+        writer.close()
+    
+    if total == 0:
+        os.remove(path)
+    logger.info(f"Таблица {name}: выгружено строк {total}" + (f" в {path}" if total else ""))
+    return total, last_id
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Выгрузка таблиц бота для аналитики")
+    parser.add_argument("--tables", nargs="+", choices=list(EXPORT_TABLES), default=list(EXPORT_TABLES))
+    parser.add_argument("--format", choices=["auto", "parquet", "csv"], default="auto",
+                        help="auto - Parquet, если установлен pyarrow, иначе CSV")
+    parser.add_argument("--output", default=EXPORT_PATH, help="Каталог для файлов выгрузки")
+    parser.add_argument("--since-last", action="store_true", help="Только строки, добавленные после прошлой выгрузки")
+    parser.add_argument("--since", help="Только строки, созданные начиная с даты ДД.ММ.ГГГГ")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+    
+    if args.format == "parquet" and pa is None:
+        parser.error("Для формата parquet установите pyarrow: pip install pyarrow")
+    writer_class = ParquetChunkWriter if args.format != "csv" and pa is not None else CsvChunkWriter
+    since = datetime.strptime(args.since, "%d.%m.%Y") if args.since else None
+    
+    os.makedirs(args.output, exist_ok=True)
+    state_path = os.path.join(args.output, "export_state.json")
+    state = load_state(state_path)
+    
+    try:
+        for name in args.tables:
+            after_id = state.get(name, 0) if args.since_last else 0
+            total, last_id = await export_table(name, writer_class, args.output, after_id, since, args.chunk_size)
+            # Отметку двигаем только вперед, чтобы выборочная выгрузка не сбила инкрементальную
+            if last_id > state.get(name, 0):
+                state[name] = last_id
+                save_state(state_path, state)
+    finally:
+        await close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,13 +3,26 @@
 """
 
 from aiogram import Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
+from datetime import datetime, timedelta
 from loguru import logger
+import html
+import json
 
 from keyboards.reply import get_main_keyboard, get_admin_keyboard
-from database.models import User, get_user_by_id, create_user
-from utils.helpers import is_admin
+from database.models import User, get_user_by_id, register_user, user_cache, count_active_users
+from database.activity import activity_buffer
+from database.stats import get_latest_stats, truncate_day
+from database.search import search_messages
+from config import SEARCH_PAGE_SIZE
+from utils.helpers import is_admin, get_uptime
+from utils.response_cache import response_cache
+from utils.scheduler import ai_scheduler
+from utils.ai_services import ai_services
+from utils.conversation import conversation_memory
+from utils.intents import intent_router
+from utils.ai_metrics import ai_metrics
 
 
 async def cmd_start(message: types.Message, state: FSMContext):
@@ -19,11 +32,9 @@ async def cmd_start(message: types.Message, state: FSMContext):
         user_name = message.from_user.full_name
         username = message.from_user.username
         
-        # Проверяем, есть ли пользователь в базе
-        user = await get_user_by_id(user_id)
-        if not user:
-            # Создаем нового пользователя
-            await create_user(user_id, user_name, username)
+        # Регистрируем пользователя или обновляем его данные одним запросом
+        user, is_new = await register_user(user_id, user_name, username)
+        if is_new:
             logger.info(f"Новый пользователь: {user_name} (ID: {user_id})")
         
         welcome_text = f"""
@@ -99,6 +110,10 @@ async def cmd_profile(message: types.Message):
         user = await get_user_by_id(user_id)
         
         if user:
+            # Активность, еще не сброшенная буфером в базу данных
+            pending_activity, pending_messages = activity_buffer.pending(user_id)
+            last_activity = max(user.last_activity, pending_activity) if pending_activity else user.last_activity
+            
             profile_text = f"""
 👤 <b>Ваш профиль</b>
 
@@ -106,8 +121,8 @@ async def cmd_profile(message: types.Message):
 <b>Username:</b> @{user.username or 'Не указан'}
 <b>ID:</b> {user.user_id}
 <b>Дата регистрации:</b> {user.created_at.strftime('%d.%m.%Y %H:%M')}
-<b>Сообщений отправлено:</b> {user.messages_count}
-<b>Последняя активность:</b> {user.last_activity.strftime('%d.%m.%Y %H:%M')}
+<b>Сообщений отправлено:</b> {user.messages_count + pending_messages}
+<b>Последняя активность:</b> {last_activity.strftime('%d.%m.%Y %H:%M')}
             """
         else:
             profile_text = "Профиль не найден. Используйте /start для регистрации."
@@ -133,6 +148,8 @@ async def cmd_admin(message: types.Message):
 📊 <b>Статистика:</b>
 /stats - Общая статистика бота
 /users - Список пользователей
+/search - Поиск по сообщениям
+/aistats - Задержки, токены и расходы AI
 
 📢 <b>Рассылка:</b>
 /broadcast - Отправить сообщение всем
@@ -155,27 +172,186 @@ async def cmd_stats(message: types.Message):
         await message.answer("⛔ У вас нет доступа к статистике.")
         return
     
-    # Здесь будет логика получения статистики
-    stats_text = """
+    cache_stats = user_cache.stats()
+    ai_cache_stats = response_cache.stats()
+    memory_stats = conversation_memory.stats()
+    intent_stats = intent_router.stats()
+    queue_text = ", ".join(
+        f"{name} {pool['active']}/{pool['concurrency']} (в очереди {pool['queued']}, отклонено {pool['rejected'] + pool['expired']})"
+        for name, pool in ai_scheduler.stats().items()
+    )
+    models_text = "\n".join(
+        f"• {model}: {info['state']}, p95 {info['p95']:.1f} с" if info['p95'] is not None else f"• {model}: {info['state']}"
+        for router in (ai_services.text_router, ai_services.image_router)
+        for model, info in router.stats().items()
+    )
+    
+    # Статистика берется из готовых агрегатов, без сканирования таблиц
+    day, hour = await get_latest_stats()
+    is_today = day is not None and day.date == truncate_day(datetime.now())
+    total_users = hour.total_users if hour else 0
+    updated_at = f"{hour.date:%d.%m.%Y %H:00}" if hour else "нет данных"
+    # Подсчет по индексу last_activity, без загрузки строк
+    active_recently = await count_active_users(hours=24)
+    
+    commands = json.loads(day.commands_used or "{}") if is_today else {}
+    top_commands = sorted(commands.items(), key=lambda item: item[1], reverse=True)[:5]
+    commands_text = "\n".join(
+        f"• {name}: {count} использований" for name, count in top_commands
+    ) or "• Нет данных"
+    
+    stats_text = f"""
 📊 <b>Статистика бота</b>
 
 <b>Общая информация:</b>
-• Всего пользователей: 0
-• Активных сегодня: 0
-• Сообщений обработано: 0
+• Всего пользователей: {total_users}
+• Новых сегодня: {day.new_users if is_today else 0}
+• Активных сегодня: {day.active_users if is_today else 0}
+• Сообщений сегодня: {day.total_messages if is_today else 0}
+• Активных за 24 часа: {active_recently}
 
-<b>Популярные команды:</b>
-• /start: 0 использований
-• /help: 0 использований
+<b>Популярные команды сегодня:</b>
+{commands_text}
 
 <b>Система:</b>
-• Время работы: 0 минут
+• Время работы: {get_uptime()}
 • Статус: Активен
+• Данные на: {updated_at}
+• Кэш пользователей: {cache_stats['size']}/{cache_stats['max_size']}, попаданий {cache_stats['hits']}, промахов {cache_stats['misses']} ({cache_stats['hit_rate']:.0%})
+• Кэш AI ответов: {ai_cache_stats['size']} записей, {ai_cache_stats['bytes'] // 1024} КБ, попаданий {ai_cache_stats['hits']} (Redis: {ai_cache_stats['redis_hits']}), промахов {ai_cache_stats['misses']} ({ai_cache_stats['hit_rate']:.0%})
+• Память разговоров: {memory_stats['conversations']} активных, ~{memory_stats['tokens']} токенов
+• Готовые ответы: {intent_stats['answered']}, передано AI {intent_stats['passed']} ({intent_stats['intents']} намерений)
+• Запросы к AI: {queue_text}, объединено одинаковых {ai_services.flights.stats()['shared']}
+
+<b>Модели AI:</b>
+{models_text}
         """
     
     await message.answer(stats_text)
 
 
+SEARCH_USAGE = """
+🔎 <b>Поиск по сообщениям</b>
+
+<code>/search [user:ID] [chat:ID] [from:ДД.ММ.ГГГГ] [to:ДД.ММ.ГГГГ] [page:N] текст</code>
+
+Даты from и to включаются в период.
+Слово со звездочкой на конце (<code>заказ*</code>) ищется по началу.
+"""
+
+
+def parse_search_args(args: str) -> dict:
+    """Разбор аргументов /search: фильтры вида ключ:значение и текст запроса"""
+    params = {"query": [], "page": 1}
+    for token in args.split():
+        key, _, value = token.partition(":")
+        if key == "user" and value.lstrip("-").isdigit():
+            params["user_id"] = int(value)
+        elif key == "chat" and value.lstrip("-").isdigit():
+            params["chat_id"] = int(value)
+        elif key == "from" and value:
+            params["date_from"] = datetime.strptime(value, "%d.%m.%Y")
+        elif key == "to" and value:
+            # Конец периода в search_messages не включается: берем начало следующего дня
+            params["date_to"] = datetime.strptime(value, "%d.%m.%Y") + timedelta(days=1)
+        elif key == "page" and value.isdigit():
+            params["page"] = max(int(value), 1)
+        else:
+            params["query"].append(token)
+    params["query"] = " ".join(params["query"])
+    return params
+
+
+async def cmd_search(message: types.Message, command: CommandObject):
+    """Обработчик команды /search"""
+    if not await is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет доступа к поиску.")
+        return
+    
+    try:
+        params = parse_search_args(command.args or "")
+    except ValueError:
+        await message.answer("⚠️ Неверный формат даты. Используйте ДД.ММ.ГГГГ")
+        return
+    
+    if not params["query"]:
+        await message.answer(SEARCH_USAGE)
+        return
+    
+    try:
+        page = params.pop("page")
+        results = await search_messages(
+            limit=SEARCH_PAGE_SIZE,
+            offset=(page - 1) * SEARCH_PAGE_SIZE,
+            **params
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в команде /search: {e}")
+        await message.answer("Произошла ошибка при поиске.")
+        return
+    
+    if not results:
+        await message.answer(f"🔎 По запросу «{html.escape(params['query'])}» ничего не найдено (страница {page}).")
+        return
+    
+    lines = [f"🔎 <b>Результаты поиска</b> «{html.escape(params['query'])}», страница {page}:\n"]
+    for row in results:
+        lines.append(
+            f"• <b>{row.created_at:%d.%m.%Y %H:%M}</b> user <code>{row.user_id}</code>, "
+            f"chat <code>{row.chat_id}</code> ({row.message_type})\n{html.escape(row.snippet or '')}"
+        )
+    if len(results) == SEARCH_PAGE_SIZE:
+        lines.append(f"\nСледующая страница: добавьте <code>page:{page + 1}</code>")
+    
+    await message.answer("\n".join(lines))
+
+
+def format_seconds(value) -> str:
+    """Секунды для вывода метрик (верхняя граница корзины гистограммы)"""
+    if value is None:
+        return "—"
+    if value == float("inf"):
+        return "&gt;60 с"
+    return f"≤{value:g} с"
+
+
+async def cmd_aistats(message: types.Message):
+    """Обработчик команды /aistats"""
+    if not await is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет доступа к статистике.")
+        return
+    
+    models = ai_metrics.stats()
+    if not models:
+        await message.answer("🤖 Запросов к AI еще не было.")
+        return
+    
+    lines = ["🤖 <b>Запросы к AI</b>\n"]
+    total_cost = 0.0
+    for model, info in sorted(models.items()):
+        total_cost += info["cost"]
+        errors = ", ".join(f"{name}: {count}" for name, count in sorted(info["errors"].items())) or "нет"
+        lines.append(
+            f"<b>{html.escape(model)}</b>\n"
+            f"• Запросов: {info['requests']}, ошибок: {errors}\n"
+            f"• Задержка p50/p99: {format_seconds(info['p50'])} / {format_seconds(info['p99'])}, "
+            f"первый байт p50: {format_seconds(info['ttfb_p50'])}\n"
+            f"• Токены: {info['prompt_tokens']} вход, {info['completion_tokens']} выход, ~${info['cost']:.4f}\n"
+        )
+    lines.append(f"💰 <b>Всего:</b> ~${total_cost:.4f}")
+    
+    top_users = ai_metrics.quota.top()
+    if top_users:
+        limit = ai_metrics.quota.daily_limit
+        lines.append("\n👥 <b>Расход токенов сегодня:</b>")
+        lines.extend(
+            f"• <code>{user_id}</code>: {tokens}" + (f" из {limit}" if limit else "")
+            for user_id, tokens in top_users
+        )
+    
+    await message.answer("\n".join(lines))
+
+
 def register_command_handlers(dp: Dispatcher):
     """Регистрация обработчиков команд"""
     dp.message.register(cmd_start, Command("start"))
@@ -183,3 +359,5 @@ def register_command_handlers(dp: Dispatcher):
     dp.message.register(cmd_profile, Command("profile"))
     dp.message.register(cmd_admin, Command("admin"))
     dp.message.register(cmd_stats, Command("stats"))
+    dp.message.register(cmd_search, Command("search"))
+    dp.message.register(cmd_aistats, Command("aistats"))
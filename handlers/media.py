@@ -5,21 +5,145 @@
 from aiogram import Dispatcher, types, F
 from aiogram.fsm.context import FSMContext
 from loguru import logger
+from typing import List, Optional
+import asyncio
+import html
 import os
 
-from database.models import update_user_activity
 from config import UPLOAD_PATH, ALLOWED_EXTENSIONS, MAX_FILE_SIZE
-from utils.ai_services import ai_services
+from database.image_cache import image_analysis_cache, content_hash
+from utils.ai_services import ai_services, DEFAULT_IMAGE_PROMPT, DEFAULT_ALBUM_PROMPT
+from utils.images import select_photo_size, prepare_image
+from utils.media_group import media_group_collector
+
+
+async def download_photo(message: types.Message, photo: types.PhotoSize) -> memoryview:
+    """Скачивание фото; буфер BytesIO возвращается как memoryview, без копирования в bytes"""
+    file = await message.bot.get_file(photo.file_id)
+    file_data = await message.bot.download_file(file.file_path)
+    return file_data.getbuffer()
+
+
+async def analyze_photo(message: types.Message, photo: types.PhotoSize) -> Optional[str]:
+    """
+    AI анализ фото с кэшем
+    
+    Повторное изображение (тот же file_unique_id) не скачивается и не отправляется в Gemini;
+    после скачивания дополнительно проверяется кэш по хэшу содержимого.
+    """
+    analysis = await image_analysis_cache.get(photo.file_unique_id, DEFAULT_IMAGE_PROMPT)
+    if analysis is not None:
+        return analysis
+    
+    image_data = await download_photo(message, photo)
+    digest = content_hash(image_data)
+    
+    analysis = await image_analysis_cache.get_by_content(digest, DEFAULT_IMAGE_PROMPT)
+    if analysis is None:
+        prepared, mime_type = await prepare_image(image_data)
+        analysis = await ai_services.analyze_image_with_gemini(
+            prepared,
+            DEFAULT_IMAGE_PROMPT,
+            user_id=message.from_user.id,
+            file_unique_id=photo.file_unique_id,
+            mime_type=mime_type
+        )
+    
+    if analysis:
+        await image_analysis_cache.set(photo.file_unique_id, digest, DEFAULT_IMAGE_PROMPT, analysis)
+    return analysis
+
+
+async def analyze_album(message: types.Message, photos: List[types.PhotoSize]) -> Optional[str]:
+    """
+    AI анализ альбома одним запросом к Gemini
+    
+    Результат кэшируется по набору file_unique_id фотографий альбома.
+    """
+    album_key = "album:" + content_hash("|".join(photo.file_unique_id for photo in photos).encode("utf-8"))
+    analysis = await image_analysis_cache.get(album_key, DEFAULT_ALBUM_PROMPT)
+    if analysis is not None:
+        return analysis
+    
+    buffers = await asyncio.gather(*(download_photo(message, photo) for photo in photos))
+    prepared = await asyncio.gather(*(prepare_image(buffer) for buffer in buffers))
+    analysis = await ai_services.analyze_images_with_gemini(
+        list(prepared),
+        DEFAULT_ALBUM_PROMPT,
+        user_id=message.from_user.id,
+        group_key=album_key
+    )
+    
+    if analysis:
+        await image_analysis_cache.set(album_key, None, DEFAULT_ALBUM_PROMPT, analysis)
+    return analysis
+
+
+async def handle_photo_album(parts: List[types.Message]):
+    """Обработка альбома: одна загрузка в AI и один ответ на все фотографии"""
+    message = parts[0]
+    try:
+        user_id = message.from_user.id
+        photos = [select_photo_size(part.photo) for part in parts]
+        
+        logger.info(f"Получен альбом из {len(photos)} фото от {message.from_user.full_name} (ID: {user_id})")
+        
+        # Слишком большие файлы пропускаем, остальные анализируем
+        limit = MAX_FILE_SIZE * 1024 * 1024
+        accepted = [photo for photo in photos if not (photo.file_size and photo.file_size > limit)]
+        skipped = len(photos) - len(accepted)
+        total_size = sum(photo.file_size or 0 for photo in accepted)
+        
+        analysis = None
+        if accepted:
+            try:
+                analysis = await analyze_album(message, accepted)
+            except Exception as e:
+                logger.error(f"Error analyzing album: {e}")
+        
+        skipped_text = f"\n⚠️ Пропущено больших файлов: {skipped} (максимум {MAX_FILE_SIZE} MB)" if skipped else ""
+        analysis_text = f"""
+🤖 <b>AI анализ:</b>
+{html.escape(analysis)}
+""" if analysis else ""
+        
+        response = f"""
+📸 <b>Получен альбом!</b>
+
+<b>Информация:</b>
+• Фотографий: {len(photos)}
+• Общий размер: {total_size or 'Неизвестно'} байт
+• Отправитель: {message.from_user.full_name}{skipped_text}
+{analysis_text}
+<b>Что я могу сделать:</b>
+• Сохранить фото
+• Обработать изображения
+• Отправить обратно
+
+Спасибо за фото! 😊
+        """
+        
+        await message.answer(response)
+        
+    except Exception as e:
+        logger.error(f"Ошибка при обработке альбома: {e}")
+        await message.answer("Произошла ошибка при обработке альбома.")
 
 
 async def handle_photo(message: types.Message, state: FSMContext):
     """Обработчик фотографий"""
     try:
+        # Части альбома собираются и обрабатываются вместе
+        if message.media_group_id:
+            parts = await media_group_collector.collect(message)
+            if parts is not None:
+                await handle_photo_album(parts)
+            return
+        
         user_id = message.from_user.id
-        await update_user_activity(user_id)
         
         # Получаем информацию о фото
-        photo = message.photo[-1]  # Берем самое большое фото
+        photo = select_photo_size(message.photo)  # Наименьший размер, достаточный для анализа
         file_id = photo.file_id
         file_size = photo.file_size
         
@@ -30,14 +154,9 @@ async def handle_photo(message: types.Message, state: FSMContext):
             await message.answer(f"⚠️ Файл слишком большой. Максимальный размер: {MAX_FILE_SIZE} MB")
             return
         
-        # Анализируем изображение с помощью AI
+        # Анализируем изображение с помощью AI (с учетом кэша)
         try:
-            # Получаем файл изображения
-            file = await message.bot.get_file(file_id)
-            file_data = await message.bot.download_file(file.file_path)
-            
-            # Анализируем с помощью Gemini
-            analysis = await ai_services.analyze_image_with_gemini(file_data.read())
+            analysis = await analyze_photo(message, photo)
             
             if analysis:
                 response = f"""
@@ -49,7 +168,7 @@ async def handle_photo(message: types.Message, state: FSMContext):
 • Отправитель: {message.from_user.full_name}
 
 🤖 <b>AI анализ:</b>
-{analysis}
+{html.escape(analysis)}
 
 <b>Что я могу сделать:</b>
 • Сохранить фото
@@ -103,7 +222,6 @@ async def handle_video(message: types.Message, state: FSMContext):
     """Обработчик видео"""
     try:
         user_id = message.from_user.id
-        await update_user_activity(user_id)
         
         video = message.video
         file_id = video.file_id
@@ -147,7 +265,6 @@ async def handle_document(message: types.Message, state: FSMContext):
     """Обработчик документов"""
     try:
         user_id = message.from_user.id
-        await update_user_activity(user_id)
         
         document = message.document
         file_name = document.file_name
@@ -195,7 +312,6 @@ async def handle_voice(message: types.Message, state: FSMContext):
     """Обработчик голосовых сообщений"""
     try:
         user_id = message.from_user.id
-        await update_user_activity(user_id)
         
         voice = message.voice
         duration = voice.duration
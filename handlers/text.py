@@ -5,10 +5,31 @@
 from aiogram import Dispatcher, types, F
 from aiogram.fsm.context import FSMContext
 from loguru import logger
+import html
 
-from database.models import update_user_activity, increment_message_count
+from config import AI_STREAMING_ENABLED, CONVERSATION_ENABLED
 from utils.helpers import is_admin
-from utils.ai_services import ai_services
+from utils.ai_services import ai_services, AI_FALLBACK_RESPONSE
+from utils.conversation import conversation_memory
+from utils.intents import intent_router
+from utils.streaming import send_streaming_reply
+
+
+def format_ai_response(ai_response: str, text: str) -> str:
+    """Оформление ответа AI"""
+    return f"""
+🤖 <b>AI ответ:</b>
+{html.escape(ai_response)}
+
+💬 <b>Ваше сообщение:</b>
+"{text}"
+                """
+
+
+def remember_exchange(user_id: int, text: str, ai_response: str):
+    """Сохранение сообщения и ответа AI в памяти разговора"""
+    if CONVERSATION_ENABLED and ai_response and ai_response.strip() != AI_FALLBACK_RESPONSE:
+        conversation_memory.add_exchange(user_id, text, ai_response.strip())
 
 
 async def handle_text_message(message: types.Message, state: FSMContext):
@@ -17,51 +38,30 @@ async def handle_text_message(message: types.Message, state: FSMContext):
         user_id = message.from_user.id
         text = message.text
         
-        # Обновляем активность пользователя
-        await update_user_activity(user_id)
-        await increment_message_count(user_id)
-        
         # Логируем сообщение
         logger.info(f"Сообщение от {message.from_user.full_name} (ID: {user_id}): {text}")
         
-        # Умная логика ответа с AI
-        if "привет" in text.lower():
-            response = f"Привет, {message.from_user.first_name}! 👋"
-        elif "как дела" in text.lower():
-            response = "Спасибо, у меня все отлично! А у вас как дела? 😊"
-        elif "спасибо" in text.lower():
-            response = "Пожалуйста! Рад быть полезным! 🙏"
-        elif "пока" in text.lower() or "до свидания" in text.lower():
-            response = "До свидания! Буду ждать нашего следующего разговора! 👋"
-        elif "помощь" in text.lower() or "help" in text.lower():
-            response = """
-📚 <b>Как я могу помочь?</b>
-
-<b>Основные команды:</b>
-/start - Начать работу
-/help - Подробная справка
-/profile - Ваш профиль
-
-<b>Что я умею:</b>
-• Отвечать на сообщения с помощью AI
-• Обрабатывать медиа-файлы
-• Анализировать изображения
-• Показывать статистику
-• Помогать администраторам
-
-Просто напишите мне что-нибудь, и я постараюсь помочь!
-            """
-        else:
+        # Готовые ответы из таблицы намерений, остальное - AI
+        response = intent_router.respond(text, message.from_user.first_name)
+        if response is None:
             # Используем AI для умного ответа
             try:
-                ai_response = await ai_services.get_smart_response(text)
-                response = f"""
-🤖 <b>AI ответ:</b>
-{ai_response}
-
-💬 <b>Ваше сообщение:</b>
-"{text}"
-                """
+                # История разговора берется из памяти, без запросов к базе данных
+                context = conversation_memory.get_context(user_id) if CONVERSATION_ENABLED else ""
+                
+                if AI_STREAMING_ENABLED:
+                    # Ответ появляется по мере генерации, без ожидания полного текста
+                    ai_response = await send_streaming_reply(
+                        message,
+                        ai_services.stream_smart_response(text, context=context, user_id=user_id),
+                        render=lambda partial: format_ai_response(partial, text)
+                    )
+                    remember_exchange(user_id, text, ai_response)
+                    return
+                
+                ai_response = await ai_services.get_smart_response(text, context=context, user_id=user_id)
+                remember_exchange(user_id, text, ai_response)
+                response = format_ai_response(ai_response, text)
             except Exception as e:
                 logger.error(f"AI error: {e}")
                 response = f"""
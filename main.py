@@ -31,6 +31,7 @@ logger.add(
 
 async def main():
     """Главная функция запуска бота"""
+    bot = None
     try:
         logger.info("Запуск ChatBot Becks...")
         
@@ -49,6 +50,8 @@ async def main():
         logger.error(f"Ошибка при запуске бота: {e}")
         raise
     finally:
+        if bot is not None:
+            await bot.stop()
         logger.info("Бот остановлен")
 
 if __name__ == "__main__":
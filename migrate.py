@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Миграция схемы базы данных
+
+Примеры:
+    python migrate.py               # обновить до последней версии
+    python migrate.py current       # показать текущую и последнюю версии
+    python migrate.py upgrade 0002  # обновить до указанной ревизии
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.append(str(Path(__file__).parent))
+
+from loguru import logger
+
+from database.models import get_schema_version, close_database
+from database.schema import get_head_revision, upgrade_database
+
+
+async def show_current():
+    """Вывод текущей и последней версий схемы"""
+    try:
+        version = await get_schema_version()
+    finally:
+        await close_database()
+    logger.info(f"Текущая версия схемы: {version or 'нет'}, последняя: {get_head_revision()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграция схемы базы данных")
+    parser.add_argument("action", nargs="?", choices=["upgrade", "current"], default="upgrade")
+    parser.add_argument("revision", nargs="?", default="head")
+    args = parser.parse_args()
+    
+    if args.action == "current":
+        asyncio.run(show_current())
+        return
+    
+    logger.info(f"Миграция схемы базы данных до {args.revision}...")
+    upgrade_database(args.revision)
+    logger.info("Миграция завершена")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Окружение Alembic для миграций схемы базы данных
+"""
+
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+
+from database.models import Base
+from database.schema import get_sync_database_url
+
+config = context.config
+
+# Логирование Alembic настраиваем только при запуске из командной строки
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    """Генерация SQL без подключения к базе данных (alembic upgrade --sql)"""
+    context.configure(
+        url=get_sync_database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Применение миграций к базе данных"""
+    engine = create_engine(get_sync_database_url())
+    try:
+        with engine.connect() as connection:
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+                # batch-режим нужен SQLite для изменения существующих таблиц
+                render_as_batch=connection.dialect.name == "sqlite"
+            )
+            with context.begin_transaction():
+                context.run_migrations()
+    finally:
+        engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,65 @@
+"""
+Начальная схема: users, messages, statistics
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(255), nullable=True),
+        sa.Column("full_name", sa.String(255), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("is_admin", sa.Boolean(), nullable=True),
+        sa.Column("messages_count", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("last_activity", sa.DateTime(), nullable=True),
+        sa.Column("language_code", sa.String(10), nullable=True),
+        sa.Column("settings", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_user_id", "users", ["user_id"], unique=True)
+    
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("message_id", sa.Integer(), nullable=False),
+        sa.Column("chat_id", sa.Integer(), nullable=False),
+        sa.Column("message_type", sa.String(50), nullable=False),
+        sa.Column("content", sa.Text(), nullable=True),
+        sa.Column("file_id", sa.String(255), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_messages_id", "messages", ["id"])
+    
+    op.create_table(
+        "statistics",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("date", sa.DateTime(), nullable=True),
+        sa.Column("total_users", sa.Integer(), nullable=True),
+        sa.Column("active_users", sa.Integer(), nullable=True),
+        sa.Column("total_messages", sa.Integer(), nullable=True),
+        sa.Column("commands_used", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_statistics_id", "statistics", ["id"])
+
+
+def downgrade():
+    op.drop_table("statistics")
+    op.drop_table("messages")
+    op.drop_table("users")
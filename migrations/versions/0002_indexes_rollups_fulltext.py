@@ -0,0 +1,103 @@
+"""
+Индексы для выборок по активности и истории, агрегаты статистики, полнотекстовый поиск
+
+Базы, запущенные до появления миграций, могли уже получить часть этих объектов
+при старте бота, поэтому каждый шаг проверяет, существует ли объект.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Язык словаря в выражении GIN-индекса зафиксирован: запросы должны использовать
+# то же выражение (database.models.FTS_LANGUAGE), смена языка - новая миграция
+FTS_LANGUAGE = "russian"
+
+# (имя индекса, таблица, колонки, уникальный)
+INDEXES = (
+    ("ix_users_last_activity", "users", ["last_activity"], False),
+    ("ix_messages_created_at", "messages", ["created_at"], False),
+    ("ix_messages_chat_id", "messages", ["chat_id"], False),
+    ("ix_messages_user_id_created_at", "messages", ["user_id", "created_at"], False),
+    ("ix_messages_message_type_created_at", "messages", ["message_type", "created_at"], False),
+    ("ix_statistics_period_date", "statistics", ["period", "date"], True),
+)
+
+SQLITE_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    
+    columns = {column["name"] for column in inspector.get_columns("statistics")}
+    if "period" not in columns:
+        op.add_column("statistics", sa.Column("period", sa.String(10), nullable=True))
+    if "new_users" not in columns:
+        op.add_column("statistics", sa.Column("new_users", sa.Integer(), nullable=True))
+    
+    for name, table, index_columns, unique in INDEXES:
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, index_columns, unique=unique)
+    
+    if bind.dialect.name == "postgresql":
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_messages_content_fts ON messages "
+            f"USING GIN (to_tsvector('{FTS_LANGUAGE}', coalesce(content, '')))"
+        )
+    elif bind.dialect.name == "sqlite":
+        is_new = "messages_fts" not in inspector.get_table_names()
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        if is_new:
+            # Индексируем сообщения, сохраненные до появления полнотекстового поиска
+            op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_messages_content_fts")
+    elif bind.dialect.name == "sqlite":
+        for trigger in ("messages_fts_insert", "messages_fts_delete", "messages_fts_update"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS messages_fts")
+    
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    
+    with op.batch_alter_table("statistics") as batch_op:
+        batch_op.drop_column("new_users")
+        batch_op.drop_column("period")
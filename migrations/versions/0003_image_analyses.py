@@ -0,0 +1,35 @@
+"""
+Кэш результатов анализа изображений
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "image_analyses",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("file_unique_id", sa.String(128), nullable=False),
+        sa.Column("content_hash", sa.String(64), nullable=True),
+        sa.Column("prompt_hash", sa.String(64), nullable=False),
+        sa.Column("analysis", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_image_analyses_prompt_file", "image_analyses", ["prompt_hash", "file_unique_id"], unique=True)
+    op.create_index("ix_image_analyses_prompt_content", "image_analyses", ["prompt_hash", "content_hash"])
+    op.create_index("ix_image_analyses_created_at", "image_analyses", ["created_at"])
+
+
+def downgrade():
+    op.drop_table("image_analyses")
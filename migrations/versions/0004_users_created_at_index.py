@@ -0,0 +1,27 @@
+"""
+Индекс по времени регистрации пользователей (агрегация статистики)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing = {index["name"] for index in inspector.get_indexes("users")}
+    if "ix_users_created_at" not in existing:
+        op.create_index("ix_users_created_at", "users", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_users_created_at", table_name="users")
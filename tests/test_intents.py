@@ -0,0 +1,76 @@
+"""
+Проверка таблицы намерений: короткие реплики получают готовый ответ, вопросы уходят в AI
+"""
+
+from pathlib import Path
+
+import pytest
+
+from utils.intents import Intent, IntentRouter
+
+INTENTS_FILE = Path(__file__).parent.parent / "handlers" / "intents.json"
+
+
+@pytest.fixture(scope="module")
+def router() -> IntentRouter:
+    return IntentRouter.from_file(str(INTENTS_FILE))
+
+
+@pytest.mark.parametrize("text, name", [
+    ("Привет!", "greeting"),
+    ("Добрый вечер, бот", "greeting"),
+    ("Как дела?", "how_are_you"),
+    ("как жизнь", "how_are_you"),
+    ("Спасибо большое!", "thanks"),
+    ("благодарю", "thanks"),
+    ("Ну пока", "goodbye"),
+    ("До свидания", "goodbye"),
+    ("помощь", "help"),
+    ("Что ты умеешь?", "help"),
+    ("Как тебя зовут?", "who_are_you"),
+    ("Окей", "acknowledge"),
+    ("понятно", "acknowledge"),
+])
+def test_short_messages_get_canned_reply(router, text, name):
+    found = router.match(text)
+    assert found is not None
+    assert found.intent.name == name
+
+
+@pytest.mark.parametrize("text", [
+    "помоги решить уравнение x^2=4",
+    "как ты думаешь, что такое ИИ?",
+    "что ты можешь сказать про Python",
+    "hello world program in C",
+    "hi-fi или стерео - что выбрать?",
+    "покажи, как работает сортировка пузырьком",
+    "ок, а расскажи про питон",
+    "help me write a SQL query",
+    "помощь с домашкой по физике нужна срочно",
+    "пока не понимаю, как настроить nginx",
+    "что умеешь делать с pandas dataframe",
+    "привет, напиши функцию сортировки на питоне",
+    "спасибо, а теперь объясни, что такое рекурсия",
+])
+def test_questions_pass_to_ai(router, text):
+    assert router.match(text) is None
+
+
+def test_word_boundaries_and_prefix():
+    router = IntentRouter([Intent("thanks", ("спасиб*", "ок"), ("ответ",))])
+    assert router.match("Спасибочки") is not None
+    assert router.match("около дома") is None
+    assert router.match("ок") is not None
+
+
+def test_priority_wins_over_position():
+    router = IntentRouter([
+        Intent("low", ("пока",), ("низкий",), priority=0),
+        Intent("high", ("привет",), ("высокий",), priority=10),
+    ])
+    assert router.match("пока привет").intent.name == "high"
+
+
+def test_empty_pattern_rejected():
+    with pytest.raises(ValueError):
+        IntentRouter([Intent("broken", ("!!!",), ("ответ",))])
@@ -0,0 +1,232 @@
+"""
+Метрики запросов к AI: задержки, токены, ошибки, стоимость и дневные квоты
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+import aiohttp
+
+from config import AI_MODEL_PRICES, AI_USER_DAILY_TOKENS, ADMIN_IDS
+
+# Границы корзин гистограмм задержки (секунды)
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60]
+
+# Пользователь, от имени которого выполняется текущий запрос к AI
+current_user_id: ContextVar[Optional[int]] = ContextVar("current_user_id", default=None)
+
+
+class QuotaExceededError(Exception):
+    """Дневная квота токенов пользователя исчерпана"""
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: память не растет с числом замеров"""
+    
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += 1
+        self.sum += value
+    
+    def percentile(self, q: float) -> Optional[float]:
+        """Оценка перцентиля (верхняя граница корзины)"""
+        if not self.total:
+            return None
+        rank = q * self.total
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class ModelMetrics:
+    """Метрики одной модели"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.cancelled = 0
+        self.errors: Dict[str, int] = {}
+        self.latency = Histogram()
+        self.ttfb = Histogram()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+
+class CallRecord:
+    """Замер одного запроса к модели"""
+    
+    __slots__ = ("started", "first_byte_at", "prompt_tokens", "completion_tokens")
+    
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_byte_at: Optional[float] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+    
+    def first_byte(self):
+        """Отметка получения первых данных ответа"""
+        if self.first_byte_at is None:
+            self.first_byte_at = time.monotonic()
+    
+    def set_usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        """Токены из поля usage ответа"""
+        self.prompt_tokens = prompt_tokens or 0
+        self.completion_tokens = completion_tokens or 0
+
+
+def classify_error(error: BaseException) -> str:
+    """Класс ошибки для метрик"""
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        if status == 429:
+            return "http_429"
+        return "http_5xx" if status >= 500 else "http_4xx"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, aiohttp.ClientConnectionError):
+        return "connection"
+    if isinstance(error, aiohttp.ClientPayloadError):
+        return "payload"
+    return type(error).__name__
+
+
+class TokenQuota:
+    """Дневная квота токенов на пользователя (сбрасывается в полночь)"""
+    
+    def __init__(self, daily_limit: int = AI_USER_DAILY_TOKENS, exempt: Optional[List[int]] = None):
+        self.daily_limit = daily_limit
+        self.exempt = set(exempt if exempt is not None else ADMIN_IDS)
+        self._day = date.today()
+        self._used: Dict[int, int] = {}
+    
+    def _rollover(self):
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self._used.clear()
+    
+    def used(self, user_id: int) -> int:
+        """Токенов израсходовано сегодня"""
+        self._rollover()
+        return self._used.get(user_id, 0)
+    
+    def allow(self, user_id: Optional[int]) -> bool:
+        """Можно ли выполнить запрос от имени пользователя"""
+        if not self.daily_limit or user_id is None or user_id in self.exempt:
+            return True
+        return self.used(user_id) < self.daily_limit
+    
+    def check(self, user_id: Optional[int]):
+        """
+        Проверка квоты перед запросом
+        
+        Raises:
+            QuotaExceededError: квота на сегодня исчерпана
+        """
+        if not self.allow(user_id):
+            raise QuotaExceededError(f"Дневная квота токенов исчерпана (пользователь {user_id})")
+    
+    def add(self, user_id: Optional[int], tokens: int):
+        """Учет израсходованных токенов"""
+        if user_id is None or not tokens:
+            return
+        self._rollover()
+        self._used[user_id] = self._used.get(user_id, 0) + tokens
+    
+    def top(self, limit: int = 5) -> List[Tuple[int, int]]:
+        """Пользователи с наибольшим расходом токенов сегодня"""
+        self._rollover()
+        return sorted(self._used.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+class AIMetrics:
+    """
+    Метрики запросов к AI по моделям
+    
+    Для каждой модели: гистограммы задержки и времени до первого байта, токены из поля
+    usage, ошибки по классам и оценка стоимости по AI_MODEL_PRICES (USD за 1M токенов).
+    """
+    
+    def __init__(self, prices: Dict[str, Tuple[float, float]] = AI_MODEL_PRICES):
+        self.prices = prices
+        self.models: Dict[str, ModelMetrics] = {}
+        self.quota = TokenQuota()
+    
+    def _model(self, model: str) -> ModelMetrics:
+        metrics = self.models.get(model)
+        if metrics is None:
+            metrics = self.models[model] = ModelMetrics()
+        return metrics
+    
+    def estimate_cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """Оценка стоимости запроса в USD"""
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    
+    @contextmanager
+    def track(self, model: str) -> Iterator[CallRecord]:
+        """
+        Замер запроса к модели
+        
+        Задержка, время до первого байта и токены записываются при выходе из блока;
+        токены учитываются в квоте пользователя из current_user_id.
+        """
+        record = CallRecord()
+        metrics = self._model(model)
+        try:
+            yield record
+        except asyncio.CancelledError:
+            # Отмененный запрос (например, проигравший хедж) - не ошибка модели
+            metrics.cancelled += 1
+            raise
+        except Exception as e:
+            error_class = classify_error(e)
+            metrics.requests += 1
+            metrics.errors[error_class] = metrics.errors.get(error_class, 0) + 1
+            metrics.latency.observe(time.monotonic() - record.started)
+            raise
+        else:
+            metrics.requests += 1
+            metrics.latency.observe(time.monotonic() - record.started)
+        finally:
+            if record.first_byte_at is not None:
+                metrics.ttfb.observe(record.first_byte_at - record.started)
+            if record.prompt_tokens or record.completion_tokens:
+                metrics.prompt_tokens += record.prompt_tokens
+                metrics.completion_tokens += record.completion_tokens
+                metrics.cost += self.estimate_cost(model, record.prompt_tokens, record.completion_tokens)
+                self.quota.add(current_user_id.get(), record.prompt_tokens + record.completion_tokens)
+    
+    def stats(self) -> Dict[str, Dict]:
+        """Сводка по моделям"""
+        return {
+            model: {
+                "requests": metrics.requests,
+                "errors": dict(metrics.errors),
+                "cancelled": metrics.cancelled,
+                "p50": metrics.latency.percentile(0.5),
+                "p99": metrics.latency.percentile(0.99),
+                "ttfb_p50": metrics.ttfb.percentile(0.5),
+                "prompt_tokens": metrics.prompt_tokens,
+                "completion_tokens": metrics.completion_tokens,
+                "cost": metrics.cost
+            }
+            for model, metrics in self.models.items()
+        }
+
+
+# Создаем глобальный экземпляр
+ai_metrics = AIMetrics()
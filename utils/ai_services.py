@@ -5,15 +5,78 @@
 import aiohttp
 import json
 import base64
-from typing import Optional, Dict, Any
+import hashlib
+import time
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
 from loguru import logger
 
 from config import (
     OPENROUTER_API_KEY, 
     GEMINI_API_KEY, 
     OPENROUTER_BASE_URL, 
-    GEMINI_BASE_URL
+    GEMINI_BASE_URL,
+    AI_HTTP_POOL_SIZE,
+    AI_HTTP_POOL_PER_HOST,
+    AI_HTTP_DNS_TTL,
+    AI_HTTP_KEEPALIVE,
+    AI_HTTP_TIMEOUT,
+    AI_HTTP_CONNECT_TIMEOUT,
+    AI_CACHE_ENABLED,
+    OPENROUTER_MODELS,
+    GEMINI_MODELS
 )
+from utils.response_cache import response_cache, normalize_text
+from utils.scheduler import ai_scheduler, SchedulerError
+from utils.model_router import ModelRouter
+from utils.singleflight import SingleFlight
+from utils.images import ImageBuffer, detect_mime_type
+from utils.ai_metrics import ai_metrics, current_user_id, QuotaExceededError
+
+# Основная модель OpenRouter (первая в цепочке)
+DEFAULT_TEXT_MODEL = OPENROUTER_MODELS[0]
+
+# Версия промпта get_smart_response; увеличьте при изменении текста промпта,
+# чтобы не отдавать из кэша ответы на старый промпт
+SMART_PROMPT_VERSION = "1"
+
+# Запрос для анализа изображения по умолчанию
+DEFAULT_IMAGE_PROMPT = "Опиши это изображение"
+
+# Запрос для анализа альбома (нескольких изображений одним запросом)
+DEFAULT_ALBUM_PROMPT = "Опиши эти изображения: что на них и что их объединяет"
+
+# Ответ, если AI недоступен
+AI_FALLBACK_RESPONSE = "Извините, у меня временные проблемы с AI. Попробуйте позже! 🤖"
+
+# Ответ при исчерпанной дневной квоте токенов
+AI_QUOTA_RESPONSE = "На сегодня лимит AI ответов исчерпан. Возвращайтесь завтра! 🌙"
+
+# Отказы, которые относятся к пользователю запроса, а не к AI сервису
+SCHEDULER_REJECTIONS = (SchedulerError, QuotaExceededError)
+
+SMART_PROMPT_TEMPLATE = """
+Ты - дружелюбный и полезный Telegram бот ChatBot Becks. 
+Отвечай кратко, дружелюбно и с эмодзи.
+
+Контекст: {context}
+Сообщение пользователя: {user_message}
+
+Ответь как умный помощник, который может:
+- Поддерживать разговор
+- Давать полезные советы
+- Отвечать на вопросы
+- Быть вежливым и дружелюбным
+
+Ответ должен быть на русском языке и не длиннее 200 символов.
+"""
+
+
+class AIHTTPError(Exception):
+    """Ошибка HTTP от AI API (код ответа в status)"""
+    
+    def __init__(self, service: str, status: int):
+        super().__init__(f"{service} API error: {status}")
+        self.status = status
 
 
 class AIServices:
@@ -24,157 +87,525 @@ class AIServices:
         self.gemini_api_key = GEMINI_API_KEY
         self.openrouter_url = OPENROUTER_BASE_URL
         self.gemini_url = GEMINI_BASE_URL
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.text_router = ModelRouter("text", OPENROUTER_MODELS)
+        self.image_router = ModelRouter("image", GEMINI_MODELS)
+        self.flights = SingleFlight()
+    
+    async def start(self):
+        """Открытие общего HTTP-клиента с пулом соединений"""
+        if self._session is not None and not self._session.closed:
+            return
+        
+        connector = aiohttp.TCPConnector(
+            limit=AI_HTTP_POOL_SIZE,
+            limit_per_host=AI_HTTP_POOL_PER_HOST,
+            ttl_dns_cache=AI_HTTP_DNS_TTL,
+            keepalive_timeout=AI_HTTP_KEEPALIVE
+        )
+        timeout = aiohttp.ClientTimeout(total=AI_HTTP_TIMEOUT, connect=AI_HTTP_CONNECT_TIMEOUT)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        logger.info(
+            f"HTTP-клиент AI сервисов открыт (пул: {AI_HTTP_POOL_SIZE}, "
+            f"на хост: {AI_HTTP_POOL_PER_HOST})"
+        )
+    
+    async def close(self):
+        """Закрытие общего HTTP-клиента"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP-клиент AI сервисов закрыт")
+        self._session = None
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Общий HTTP-клиент (открывается при первом обращении, если start не вызывался)"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+    
+    def _request_timeout(self, deadline_at: float) -> aiohttp.ClientTimeout:
+        """Таймаут запроса с учетом оставшегося до дедлайна времени"""
+        remaining = max(deadline_at - time.monotonic(), 0.001)
+        return aiohttp.ClientTimeout(total=min(remaining, AI_HTTP_TIMEOUT), connect=AI_HTTP_CONNECT_TIMEOUT)
+    
+    def _openrouter_headers(self) -> Dict[str, str]:
+        """Заголовки запроса к OpenRouter"""
+        return {
+            "Authorization": f"Bearer {self.openrouter_api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://github.com/siberianesports-creator/chatbotbecks",
+            "X-Title": "ChatBot Becks"
+        }
+    
+    def _openrouter_payload(self, prompt: str, model: str, stream: bool = False) -> Dict[str, Any]:
+        """Тело запроса chat/completions"""
+        data = {
+            "model": model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": 1000,
+            "temperature": 0.7
+        }
+        if stream:
+            data["stream"] = True
+        return data
     
-    async def get_openrouter_response(self, prompt: str, model: str = "anthropic/claude-3.5-sonnet") -> Optional[str]:
+    async def _openrouter_completion(self, prompt: str, model: str, deadline_at: float) -> str:
+        """Запрос chat/completions к одной модели; ошибки пробрасываются вызывающему"""
+        with ai_metrics.track(model) as record:
+            session = await self._get_session()
+            async with session.post(
+                f"{self.openrouter_url}/chat/completions",
+                headers=self._openrouter_headers(),
+                json=self._openrouter_payload(prompt, model),
+                timeout=self._request_timeout(deadline_at)
+            ) as response:
+                record.first_byte()
+                if response.status != 200:
+                    raise AIHTTPError("OpenRouter", response.status)
+                result = await response.json()
+                usage = result.get("usage") or {}
+                record.set_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+                return result["choices"][0]["message"]["content"]
+    
+    async def get_openrouter_response(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> Optional[str]:
         """
         Получение ответа от OpenRouter API
         
         Args:
             prompt: Текст запроса
-            model: Модель для использования
+            model: Модель для использования (None - цепочка OPENROUTER_MODELS)
+            user_id: ID пользователя (для честной очереди запросов)
             
         Returns:
             Ответ от AI или None при ошибке
         """
         try:
-            headers = {
-                "Authorization": f"Bearer {self.openrouter_api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://github.com/siberianesports-creator/chatbotbecks",
-                "X-Title": "ChatBot Becks"
-            }
-            
-            data = {
-                "model": model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "max_tokens": 1000,
-                "temperature": 0.7
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.openrouter_url}/chat/completions",
-                    headers=headers,
-                    json=data
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result["choices"][0]["message"]["content"]
-                    else:
-                        logger.error(f"OpenRouter API error: {response.status}")
-                        return None
-                        
+            return await self._request_openrouter(prompt, model, user_id)
+        except SCHEDULER_REJECTIONS:
+            return None
         except Exception as e:
             logger.error(f"Error calling OpenRouter API: {e}")
             return None
     
-    async def analyze_image_with_gemini(self, image_data: bytes, prompt: str = "Опиши это изображение") -> Optional[str]:
+    async def _request_openrouter(self, prompt: str, model: Optional[str], user_id: Optional[int]) -> str:
+        """Запрос к OpenRouter в слоте планировщика; ошибки пробрасываются вызывающему"""
+        ai_metrics.quota.check(user_id)
+        current_user_id.set(user_id)
+        async with ai_scheduler.slot("text", user_id) as remaining:
+            deadline_at = time.monotonic() + remaining
+            if model is not None:
+                return await self._openrouter_completion(prompt, model, deadline_at)
+            return await self.text_router.run(
+                lambda chain_model: self._openrouter_completion(prompt, chain_model, deadline_at)
+            )
+    
+    async def _iter_openrouter_stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Фрагменты потокового ответа OpenRouter; ошибки пробрасываются вызывающему"""
+        ai_metrics.quota.check(user_id)
+        current_user_id.set(user_id)
+        async with ai_scheduler.slot("text", user_id) as remaining:
+            deadline_at = time.monotonic() + remaining
+            if model is not None:
+                stream = self._read_openrouter_stream(prompt, model, deadline_at)
+            else:
+                stream = self.text_router.stream(
+                    lambda chain_model: self._read_openrouter_stream(prompt, chain_model, deadline_at)
+                )
+            async for chunk in stream:
+                yield chunk
+    
+    async def _read_openrouter_stream(self, prompt: str, model: str, deadline_at: float) -> AsyncIterator[str]:
+        """Чтение SSE потока chat/completions (время до первого байта - до первого фрагмента текста)"""
+        with ai_metrics.track(model) as record:
+            session = await self._get_session()
+            async with session.post(
+                f"{self.openrouter_url}/chat/completions",
+                headers=self._openrouter_headers(),
+                json=self._openrouter_payload(prompt, model, stream=True),
+                timeout=self._request_timeout(deadline_at)
+            ) as response:
+                if response.status != 200:
+                    raise AIHTTPError("OpenRouter", response.status)
+            
+                # Ответ приходит строками "data: {...}"; строки-комментарии (": OPENROUTER PROCESSING") пропускаем
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                
+                    payload = line[5:].strip()
+                    if payload == "[DONE]":
+                        return
+                
+                    try:
+                        event = json.loads(payload)
+                    except json.JSONDecodeError:
+                        continue
+                
+                    if "error" in event:
+                        error = event["error"]
+                        code = error.get("code") if isinstance(error, dict) else None
+                        if isinstance(code, int):
+                            raise AIHTTPError("OpenRouter", code)
+                        raise RuntimeError(f"OpenRouter stream error: {error}")
+                    
+                    # Последнее событие потока содержит usage
+                    usage = event.get("usage")
+                    if usage:
+                        record.set_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+                
+                    choices = event.get("choices") or []
+                    if choices:
+                        delta = (choices[0].get("delta") or {}).get("content")
+                        if delta:
+                            record.first_byte()
+                            yield delta
+    
+    async def stream_openrouter_response(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Потоковый ответ OpenRouter API (Server-Sent Events)
+        
+        Args:
+            prompt: Текст запроса
+            model: Модель для использования (None - цепочка OPENROUTER_MODELS)
+            user_id: ID пользователя (для честной очереди запросов)
+            
+        Yields:
+            Фрагменты текста ответа по мере генерации; при ошибке поток просто завершается
+        """
+        try:
+            async for chunk in self._iter_openrouter_stream(prompt, model, user_id):
+                yield chunk
+        except SCHEDULER_REJECTIONS:
+            return
+        except Exception as e:
+            logger.error(f"Error streaming OpenRouter API: {e}")
+    
+    def _gemini_body(self, images: List[Tuple[ImageBuffer, str]], prompt: str) -> bytes:
+        """
+        Тело запроса generateContent
+        
+        Base64 изображений вставляется в готовый JSON как байты: без промежуточной
+        строки и без повторного прохода json.dumps по мегабайтам данных.
+        
+        Args:
+            images: Список (данные изображения, mime-тип)
+            prompt: Запрос для анализа
+        """
+        data = {
+            "contents": [
+                {
+                    "parts": [
+                        {
+                            "text": prompt
+                        }
+                    ] + [
+                        {
+                            "inline_data": {
+                                "mime_type": mime_type,
+                                "data": "__IMAGE__"
+                            }
+                        }
+                        for _, mime_type in images
+                    ]
+                }
+            ],
+            "generationConfig": {
+                "temperature": 0.4,
+                "topK": 32,
+                "topP": 1,
+                "maxOutputTokens": 2048,
+            }
+        }
+        pieces = json.dumps(data).encode("utf-8").split(b"__IMAGE__")
+        parts = [pieces[0]]
+        for (image_data, _), piece in zip(images, pieces[1:]):
+            parts.append(base64.b64encode(image_data))
+            parts.append(piece)
+        return b"".join(parts)
+    
+    async def _gemini_generate(self, body: bytes, model: str, deadline_at: float) -> str:
+        """Запрос generateContent к одной модели Gemini; ошибки пробрасываются вызывающему"""
+        url = f"{self.gemini_url}/{model}:generateContent?key={self.gemini_api_key}"
+        
+        with ai_metrics.track(model) as record:
+            session = await self._get_session()
+            async with session.post(
+                url,
+                headers={"Content-Type": "application/json"},
+                data=body,
+                timeout=self._request_timeout(deadline_at)
+            ) as response:
+                record.first_byte()
+                if response.status != 200:
+                    raise AIHTTPError("Gemini", response.status)
+                result = await response.json()
+                usage = result.get("usageMetadata") or {}
+                record.set_usage(usage.get("promptTokenCount"), usage.get("candidatesTokenCount"))
+                if "candidates" in result and result["candidates"]:
+                    return result["candidates"][0]["content"]["parts"][0]["text"]
+                raise RuntimeError("No response from Gemini API")
+    
+    async def analyze_image_with_gemini(
+        self,
+        image_data: ImageBuffer,
+        prompt: str = DEFAULT_IMAGE_PROMPT,
+        user_id: Optional[int] = None,
+        file_unique_id: Optional[str] = None,
+        mime_type: Optional[str] = None
+    ) -> Optional[str]:
         """
         Анализ изображения с помощью Google Gemini
         
+        Одновременные запросы одного изображения (по file_unique_id или хэшу содержимого)
+        с одним промптом объединяются в один запрос к API.
+        
         Args:
-            image_data: Байты изображения
+            image_data: Байты изображения (bytes или memoryview без копирования)
             prompt: Запрос для анализа
+            user_id: ID пользователя (для честной очереди запросов)
+            file_unique_id: file_unique_id изображения в Telegram
+            mime_type: Тип изображения (по умолчанию определяется по сигнатуре)
             
         Returns:
             Описание изображения или None при ошибке
         """
+        image_key = file_unique_id or hashlib.sha256(image_data).hexdigest()
         try:
-            # Кодируем изображение в base64
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            
-            headers = {
-                "Content-Type": "application/json"
-            }
+            return await self.flights.do(
+                ("image", prompt, image_key),
+                lambda: self._analyze_images_upstream(
+                    [(image_data, mime_type or detect_mime_type(image_data))], prompt, user_id
+                ),
+                retry_on=SCHEDULER_REJECTIONS
+            )
+        except SCHEDULER_REJECTIONS:
+            return None
+    
+    async def analyze_images_with_gemini(
+        self,
+        images: List[Tuple[ImageBuffer, Optional[str]]],
+        prompt: str = DEFAULT_ALBUM_PROMPT,
+        user_id: Optional[int] = None,
+        group_key: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Анализ нескольких изображений одним запросом к Gemini (например, альбома)
+        
+        Args:
+            images: Список (данные изображения, mime-тип или None)
+            prompt: Запрос для анализа
+            user_id: ID пользователя (для честной очереди запросов)
+            group_key: Ключ набора изображений для объединения одинаковых запросов
             
-            data = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            },
-                            {
-                                "inline_data": {
-                                    "mime_type": "image/jpeg",
-                                    "data": image_base64
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": 0.4,
-                    "topK": 32,
-                    "topP": 1,
-                    "maxOutputTokens": 2048,
-                }
-            }
+        Returns:
+            Описание изображений или None при ошибке
+        """
+        prepared = [(data, mime_type or detect_mime_type(data)) for data, mime_type in images]
+        try:
+            if group_key is None:
+                return await self._analyze_images_upstream(prepared, prompt, user_id)
+            return await self.flights.do(
+                ("images", prompt, group_key),
+                lambda: self._analyze_images_upstream(prepared, prompt, user_id),
+                retry_on=SCHEDULER_REJECTIONS
+            )
+        except SCHEDULER_REJECTIONS:
+            return None
+    
+    async def _analyze_images_upstream(
+        self,
+        images: List[Tuple[ImageBuffer, str]],
+        prompt: str,
+        user_id: Optional[int]
+    ) -> Optional[str]:
+        """
+        Запрос анализа изображений к Gemini
+        
+        Отказ планировщика или квоты пробрасывается: при объединенном запросе он
+        относится к пользователю первого вызова, остальные повторяют запрос сами.
+        """
+        try:
+            ai_metrics.quota.check(user_id)
+            current_user_id.set(user_id)
             
-            url = f"{self.gemini_url}/gemini-2.0-flash-exp:generateContent?key={self.gemini_api_key}"
+            # Тело запроса собирается один раз для всех моделей цепочки
+            body = self._gemini_body(images, prompt)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if "candidates" in result and result["candidates"]:
-                            return result["candidates"][0]["content"]["parts"][0]["text"]
-                        else:
-                            logger.error("No response from Gemini API")
-                            return None
-                    else:
-                        logger.error(f"Gemini API error: {response.status}")
-                        return None
+            async with ai_scheduler.slot("image", user_id) as remaining:
+                deadline_at = time.monotonic() + remaining
+                return await self.image_router.run(
+                    lambda model: self._gemini_generate(body, model, deadline_at)
+                )
                         
+        except SCHEDULER_REJECTIONS:
+            raise
         except Exception as e:
             logger.error(f"Error calling Gemini API: {e}")
             return None
     
-    async def get_smart_response(self, user_message: str, context: str = "") -> str:
+    async def get_smart_response(self, user_message: str, context: str = "", user_id: Optional[int] = None) -> str:
         """
         Получение умного ответа на сообщение пользователя
         
         Args:
             user_message: Сообщение пользователя
             context: Контекст разговора
+            user_id: ID пользователя (для честной очереди запросов)
             
         Returns:
             Умный ответ от AI
         """
-        prompt = f"""
-Ты - дружелюбный и полезный Telegram бот ChatBot Becks. 
-Отвечай кратко, дружелюбно и с эмодзи.
-
-Контекст: {context}
-Сообщение пользователя: {user_message}
-
-Ответь как умный помощник, который может:
-- Поддерживать разговор
-- Давать полезные советы
-- Отвечать на вопросы
-- Быть вежливым и дружелюбным
-
-Ответ должен быть на русском языке и не длиннее 200 символов.
-"""
+        # Ответы с контекстом разговора зависят от истории и не кэшируются
+        cache_key = None
+        if AI_CACHE_ENABLED and not context:
+            cache_key = response_cache.make_key(user_message, DEFAULT_TEXT_MODEL, SMART_PROMPT_VERSION)
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        # Квота проверяется до запроса; ответы из кэша ее не расходуют
+        if not ai_metrics.quota.allow(user_id):
+            return AI_QUOTA_RESPONSE
+        
+        prompt = SMART_PROMPT_TEMPLATE.format(context=context, user_message=user_message)
+        
+        # Одинаковые одновременные сообщения получают ответ одного запроса;
+        # если очередь отказала первому пользователю, остальные запрашивают сами
+        try:
+            return await self.flights.do(
+                self._smart_flight_key(user_message, context),
+                lambda: self._smart_response_upstream(prompt, cache_key, user_id),
+                retry_on=SCHEDULER_REJECTIONS
+            )
+        except QuotaExceededError:
+            return AI_QUOTA_RESPONSE
+        except SchedulerError:
+            return AI_FALLBACK_RESPONSE
+    
+    def _smart_flight_key(self, user_message: str, context: str) -> tuple:
+        """Ключ объединения одинаковых запросов get_smart_response"""
+        return ("smart", SMART_PROMPT_VERSION, normalize_text(user_message), context)
+    
+    async def _smart_response_upstream(self, prompt: str, cache_key: Optional[str], user_id: Optional[int]) -> str:
+        """Запрос умного ответа к OpenRouter (отказ планировщика или квоты пробрасывается)"""
+        try:
+            response = await self._request_openrouter(prompt, None, user_id)
+        except SCHEDULER_REJECTIONS:
+            raise
+        except Exception as e:
+            logger.error(f"Error calling OpenRouter API: {e}")
+            response = None
         
-        response = await self.get_openrouter_response(prompt)
         if response:
-            return response.strip()
+            response = response.strip()
+            if cache_key is not None:
+                await response_cache.set(cache_key, response)
+            return response
         else:
             # Fallback ответ
-            return "Извините, у меня временные проблемы с AI. Попробуйте позже! 🤖"
+            return AI_FALLBACK_RESPONSE
+    
+    async def stream_smart_response(
+        self,
+        user_message: str,
+        context: str = "",
+        user_id: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Потоковый вариант get_smart_response
+        
+        Ответ из кэша отдается одним фрагментом; полный потоковый ответ сохраняется в кэш.
+        
+        Args:
+            user_message: Сообщение пользователя
+            context: Контекст разговора
+            user_id: ID пользователя (для честной очереди запросов)
+            
+        Yields:
+            Фрагменты ответа AI (или fallback ответ, если AI ничего не вернул)
+        """
+        cache_key = None
+        if AI_CACHE_ENABLED and not context:
+            cache_key = response_cache.make_key(user_message, DEFAULT_TEXT_MODEL, SMART_PROMPT_VERSION)
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        if not ai_metrics.quota.allow(user_id):
+            yield AI_QUOTA_RESPONSE
+            return
+        
+        prompt = SMART_PROMPT_TEMPLATE.format(context=context, user_message=user_message)
+        
+        # Одинаковые одновременные сообщения читают один поток ответа
+        try:
+            async for chunk in self.flights.stream(
+                ("stream",) + self._smart_flight_key(user_message, context),
+                lambda: self._stream_smart_upstream(prompt, cache_key, user_id),
+                retry_on=SCHEDULER_REJECTIONS
+            ):
+                yield chunk
+        except QuotaExceededError:
+            yield AI_QUOTA_RESPONSE
+        except SchedulerError:
+            yield AI_FALLBACK_RESPONSE
+    
+    async def _stream_smart_upstream(
+        self,
+        prompt: str,
+        cache_key: Optional[str],
+        user_id: Optional[int]
+    ) -> AsyncIterator[str]:
+        """Потоковый запрос умного ответа к OpenRouter (отказ планировщика или квоты пробрасывается)"""
+        parts = []
+        completed = False
+        try:
+            async for chunk in self._iter_openrouter_stream(prompt, user_id=user_id):
+                parts.append(chunk)
+                yield chunk
+            completed = True
+        except SCHEDULER_REJECTIONS:
+            # Отказ приходит до первого фрагмента, при объединении его обработают получатели
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming OpenRouter API: {e}")
+        
+        response = "".join(parts).strip()
+        if not response:
+            yield AI_FALLBACK_RESPONSE
+        elif completed and cache_key is not None:
+            # Оборванный на середине ответ в кэш не попадает
+            await response_cache.set(cache_key, response)
     
-    async def analyze_product_from_image(self, image_data: bytes) -> Dict[str, Any]:
+    async def analyze_product_from_image(self, image_data: ImageBuffer, user_id: Optional[int] = None) -> Dict[str, Any]:
         """
         Анализ продукта на изображении
         
         Args:
             image_data: Байты изображения
+            user_id: ID пользователя (для честной очереди запросов)
             
         Returns:
             Словарь с информацией о продукте
@@ -194,7 +625,7 @@ class AIServices:
 }
 """
         
-        response = await self.analyze_image_with_gemini(image_data, prompt)
+        response = await self.analyze_image_with_gemini(image_data, prompt, user_id=user_id)
         if response:
             try:
                 # Пытаемся извлечь JSON из ответа
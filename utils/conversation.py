@@ -0,0 +1,188 @@
+"""
+Память разговора: короткая история сообщений пользователя для контекста AI
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, NamedTuple
+from loguru import logger
+
+from config import (
+    CONVERSATION_TOKEN_BUDGET,
+    CONVERSATION_MAX_TURN_CHARS,
+    CONVERSATION_IDLE_TTL,
+    CONVERSATION_MAX_USERS
+)
+
+# Грубая оценка: символов текста на один токен
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительное число токенов в тексте"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class Turn(NamedTuple):
+    """Реплика разговора"""
+    role: str
+    text: str
+    tokens: int
+
+
+class Conversation:
+    """История разговора одного пользователя в пределах бюджета токенов"""
+    
+    __slots__ = ("turns", "tokens", "last_used")
+    
+    def __init__(self):
+        self.turns: Deque[Turn] = deque()
+        self.tokens = 0
+        self.last_used = time.monotonic()
+
+
+class ConversationMemory:
+    """
+    Память разговоров в процессе бота
+    
+    Для каждого пользователя хранится скользящая история реплик: старые реплики
+    отбрасываются, когда история превышает CONVERSATION_TOKEN_BUDGET, длинные
+    реплики обрезаются до CONVERSATION_MAX_TURN_CHARS. Неактивные разговоры удаляются
+    через CONVERSATION_IDLE_TTL, число разговоров ограничено CONVERSATION_MAX_USERS.
+    Контекст собирается из памяти, без обращений к базе данных.
+    
+    История хранится только в памяти процесса, а не в FSM storage или в таблице:
+    после перезапуска бота она начинается заново и не разделяется между
+    экземплярами бота. Для короткого контекста последних реплик этого достаточно,
+    а ответ не ждет лишнего обращения к хранилищу. Если бот работает в
+    нескольких экземплярах за балансировщиком, сообщения одного пользователя
+    должны приходить в один экземпляр, иначе контекст будет неполным.
+    """
+    
+    ROLE_NAMES = {"user": "Пользователь", "assistant": "Бот"}
+    
+    def __init__(
+        self,
+        token_budget: int = CONVERSATION_TOKEN_BUDGET,
+        max_turn_chars: int = CONVERSATION_MAX_TURN_CHARS,
+        idle_ttl: float = CONVERSATION_IDLE_TTL,
+        max_users: int = CONVERSATION_MAX_USERS
+    ):
+        self.token_budget = token_budget
+        self.max_turn_chars = max_turn_chars
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self._conversations: "OrderedDict[int, Conversation]" = OrderedDict()
+        self._task = None
+        self.evicted = 0
+    
+    def _get(self, user_id: int) -> Conversation:
+        """Разговор пользователя (создается при первом обращении)"""
+        conversation = self._conversations.get(user_id)
+        if conversation is None:
+            conversation = Conversation()
+            self._conversations[user_id] = conversation
+            # Самый давний разговор вытесняется при превышении лимита
+            while len(self._conversations) > self.max_users:
+                self._conversations.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._conversations.move_to_end(user_id)
+        conversation.last_used = time.monotonic()
+        return conversation
+    
+    def add(self, user_id: int, role: str, text: str):
+        """Добавление реплики с обрезкой истории по бюджету токенов"""
+        text = " ".join(text.split())
+        if len(text) > self.max_turn_chars:
+            text = text[:self.max_turn_chars - 1] + "…"
+        if not text:
+            return
+        
+        conversation = self._get(user_id)
+        turn = Turn(role, text, estimate_tokens(text))
+        conversation.turns.append(turn)
+        conversation.tokens += turn.tokens
+        
+        while conversation.tokens > self.token_budget and len(conversation.turns) > 1:
+            dropped = conversation.turns.popleft()
+            conversation.tokens -= dropped.tokens
+    
+    def add_exchange(self, user_id: int, user_text: str, bot_text: str):
+        """Добавление сообщения пользователя и ответа бота"""
+        self.add(user_id, "user", user_text)
+        self.add(user_id, "assistant", bot_text)
+    
+    def get_context(self, user_id: int) -> str:
+        """Контекст разговора для промпта (пустая строка, если истории нет)"""
+        conversation = self._conversations.get(user_id)
+        if conversation is None:
+            return ""
+        conversation.last_used = time.monotonic()
+        return "\n".join(
+            f"{self.ROLE_NAMES.get(turn.role, turn.role)}: {turn.text}"
+            for turn in conversation.turns
+        )
+    
+    def clear(self, user_id: int):
+        """Очистка истории пользователя"""
+        self._conversations.pop(user_id, None)
+    
+    def evict_idle(self) -> int:
+        """
+        Удаление неактивных разговоров
+        
+        Returns:
+            Количество удаленных разговоров
+        """
+        expire_before = time.monotonic() - self.idle_ttl
+        idle = [
+            user_id for user_id, conversation in self._conversations.items()
+            if conversation.last_used < expire_before
+        ]
+        for user_id in idle:
+            del self._conversations[user_id]
+        self.evicted += len(idle)
+        return len(idle)
+    
+    async def _run(self):
+        """Фоновый цикл удаления неактивных разговоров"""
+        while True:
+            await asyncio.sleep(max(self.idle_ttl / 4, 1))
+            evicted = self.evict_idle()
+            if evicted:
+                logger.debug(f"Удалено неактивных разговоров: {evicted}")
+    
+    def start(self):
+        """Запуск фонового удаления неактивных разговоров"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"Память разговоров запущена (бюджет: {self.token_budget} токенов, "
+                f"неактивность: {self.idle_ttl} с)"
+            )
+    
+    async def stop(self):
+        """Остановка фонового удаления"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Память разговоров остановлена")
+    
+    def stats(self) -> Dict[str, int]:
+        """Статистика памяти разговоров"""
+        return {
+            "conversations": len(self._conversations),
+            "tokens": sum(conversation.tokens for conversation in self._conversations.values()),
+            "evicted": self.evicted
+        }
+
+
+# Создаем глобальный экземпляр
+conversation_memory = ConversationMemory()
@@ -2,11 +2,16 @@
 Вспомогательные функции для бота
 """
 
+import time
 from aiogram import Dispatcher
 from aiogram.types import Message
 from loguru import logger
 
-from config import ADMIN_IDS
+from config import ADMIN_IDS, ARCHIVE_ENABLED
+from utils.middlewares import ActivityMiddleware, MessageArchiveMiddleware
+
+# Момент запуска процесса (для расчета времени работы)
+STARTED_AT = time.monotonic()
 
 
 async def is_admin(user_id: int) -> bool:
@@ -16,7 +21,12 @@ async def is_admin(user_id: int) -> bool:
 
 def setup_middlewares(dp: Dispatcher):
     """Настройка middleware для диспетчера"""
-    # Здесь можно добавить middleware для логирования, авторизации и т.д.
+    # Учет активности пользователей (с отложенной записью в базу)
+    dp.message.outer_middleware(ActivityMiddleware())
+    
+    # Архив сообщений (пакетная запись в фоне)
+    if ARCHIVE_ENABLED:
+        dp.message.outer_middleware(MessageArchiveMiddleware())
     logger.info("Middleware настроены")
 
 
@@ -85,3 +95,16 @@ def truncate_text(text: str, max_length: int = 100) -> str:
     if len(text) <= max_length:
         return text
     return text[:max_length-3] + "..."
+
+
+def get_uptime() -> str:
+    """Время работы бота в читаемом виде"""
+    minutes = int(time.monotonic() - STARTED_AT) // 60
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    
+    if days:
+        return f"{days} д {hours} ч {minutes} мин"
+    if hours:
+        return f"{hours} ч {minutes} мин"
+    return f"{minutes} минут"
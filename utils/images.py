@@ -0,0 +1,121 @@
+"""
+Подготовка изображений перед отправкой в Gemini
+"""
+
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Union
+from aiogram import types
+from loguru import logger
+
+from config import IMAGE_TARGET_SIDE, IMAGE_JPEG_QUALITY, IMAGE_RECOMPRESS_MIN_KB, IMAGE_WORKERS
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+    logger.warning("Pillow не установлен: изображения отправляются в Gemini без уменьшения и пересжатия")
+
+ImageBuffer = Union[bytes, bytearray, memoryview]
+
+# Форматы, которые Gemini принимает без конвертации
+GEMINI_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
+
+# Пул потоков для перекодирования (Pillow освобождает GIL на декодировании и сжатии)
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def select_photo_size(sizes: List[types.PhotoSize], target_side: int = IMAGE_TARGET_SIDE) -> types.PhotoSize:
+    """
+    Наименьший вариант фото, у которого большая сторона не меньше target_side
+    
+    Telegram присылает несколько размеров одного фото; если ни один не достигает
+    цели, берется самый большой.
+    """
+    ordered = sorted(sizes, key=lambda size: size.width * size.height)
+    for size in ordered:
+        if max(size.width, size.height) >= target_side:
+            return size
+    return ordered[-1]
+
+
+def detect_mime_type(data: ImageBuffer) -> str:
+    """Определение типа изображения по сигнатуре файла"""
+    head = bytes(data[:16])
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"heic", b"heix", b"hevc", b"hevx"):
+            return "image/heic"
+        if brand in (b"mif1", b"msf1"):
+            return "image/heif"
+    # Фото из Telegram - JPEG
+    return "image/jpeg"
+
+
+def _recompress(data: ImageBuffer, target_side: int, quality: int) -> bytes:
+    """Уменьшение и пересжатие в JPEG (выполняется в пуле потоков)"""
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((target_side, target_side))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+        return output.getvalue()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+    return _executor
+
+
+async def prepare_image(
+    data: ImageBuffer,
+    target_side: int = IMAGE_TARGET_SIDE,
+    quality: int = IMAGE_JPEG_QUALITY
+) -> Tuple[ImageBuffer, str]:
+    """
+    Подготовка изображения к отправке
+    
+    Большие изображения и форматы, которые Gemini не принимает, уменьшаются до
+    target_side по большей стороне и пересжимаются в JPEG вне event loop
+    (при установленном Pillow); остальные отправляются без копирования.
+    
+    Returns:
+        (данные изображения, mime-тип)
+    """
+    mime_type = detect_mime_type(data)
+    too_big = len(data) > IMAGE_RECOMPRESS_MIN_KB * 1024
+    if Image is None or (mime_type in GEMINI_MIME_TYPES and not too_big):
+        return data, mime_type
+    
+    try:
+        loop = asyncio.get_running_loop()
+        recompressed = await loop.run_in_executor(
+            _get_executor(), _recompress, data, target_side, quality
+        )
+    except Exception as e:
+        logger.warning(f"Не удалось перекодировать изображение: {e}")
+        return data, mime_type
+    
+    if mime_type in GEMINI_MIME_TYPES and len(recompressed) >= len(data):
+        return data, mime_type
+    return recompressed, "image/jpeg"
+
+
+def shutdown_image_workers():
+    """Остановка пула перекодирования"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
@@ -0,0 +1,203 @@
+"""
+Маршрутизация сообщений по намерениям: готовые ответы без обращения к AI
+"""
+
+import html
+import json
+import random
+import re
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from loguru import logger
+
+from config import INTENTS_FILE
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормализация текста для сопоставления
+    
+    Нижний регистр, "ё" как "е", слова через один пробел без знаков препинания:
+    границы слов в нормализованном тексте - это пробелы и края строки.
+    """
+    return " ".join(_WORD_RE.findall(text.lower().replace("ё", "е")))
+
+
+class Intent(NamedTuple):
+    """Намерение: фразы-признаки и готовые ответы"""
+    name: str
+    patterns: Tuple[str, ...]
+    responses: Tuple[str, ...]
+    priority: int = 0
+    max_words: int = 0  # 0 - без ограничения длины сообщения
+
+
+class IntentMatch(NamedTuple):
+    """Найденное намерение"""
+    intent: Intent
+    pattern: str
+    start: int
+
+
+class _Node:
+    """Узел автомата Ахо-Корасик"""
+    
+    __slots__ = ("children", "fail", "output", "patterns")
+    
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.fail: Optional["_Node"] = None
+        # Ближайший по суффиксным ссылкам узел, в котором заканчивается фраза
+        self.output: Optional["_Node"] = None
+        # (длина фразы, по началу слова, намерение, исходная фраза)
+        self.patterns: List[Tuple[int, bool, Intent, str]] = []
+
+
+class IntentRouter:
+    """
+    Поиск намерений в сообщении
+    
+    Фразы всех намерений компилируются в один автомат Ахо-Корасик, поэтому
+    сообщение проходится один раз независимо от числа фраз. Фразы сопоставляются
+    по границам слов; звездочка на конце ("спасиб*") ищет по началу слова.
+    Из нескольких найденных намерений выбирается с наибольшим приоритетом, затем
+    с самой длинной фразой, затем встреченное раньше.
+    """
+    
+    def __init__(self, intents: Iterable[Intent] = ()):
+        self.intents: List[Intent] = []
+        self._root = _Node()
+        self.hits: Dict[str, int] = {}
+        self.misses = 0
+        for intent in intents:
+            self._add(intent)
+        self._build()
+    
+    @classmethod
+    def from_file(cls, path: str) -> "IntentRouter":
+        """
+        Загрузка таблицы намерений из JSON
+        
+        Формат: {"intents": [{"name": ..., "patterns": [...], "responses": [...],
+        "priority": 0, "max_words": 0}, ...]}
+        """
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+        
+        intents = []
+        for item in table.get("intents", []):
+            responses = item["responses"]
+            if isinstance(responses, str):
+                responses = [responses]
+            if not item.get("patterns") or not responses:
+                raise ValueError(f"Намерение {item.get('name')} без фраз или ответов")
+            intents.append(Intent(
+                name=item["name"],
+                patterns=tuple(item["patterns"]),
+                responses=tuple(responses),
+                priority=int(item.get("priority", 0)),
+                max_words=int(item.get("max_words", 0))
+            ))
+        
+        router = cls(intents)
+        logger.info(f"Загружено намерений: {len(router.intents)} из {path}")
+        return router
+    
+    def _add(self, intent: Intent):
+        """Добавление фраз намерения в бор"""
+        self.intents.append(intent)
+        for pattern in intent.patterns:
+            prefix = pattern.rstrip().endswith("*")
+            phrase = normalize_text(pattern)
+            if not phrase:
+                raise ValueError(f"Пустая фраза в намерении {intent.name}: {pattern!r}")
+            
+            node = self._root
+            for char in phrase:
+                node = node.children.setdefault(char, _Node())
+            node.patterns.append((len(phrase), prefix, intent, pattern))
+    
+    def _build(self):
+        """Построение суффиксных ссылок обходом бора в ширину"""
+        queue = deque()
+        for child in self._root.children.values():
+            child.fail = self._root
+            queue.append(child)
+        
+        while queue:
+            node = queue.popleft()
+            for char, child in node.children.items():
+                fail = node.fail
+                while fail is not None and char not in fail.children:
+                    fail = fail.fail
+                child.fail = fail.children[char] if fail is not None else self._root
+                child.output = child.fail if child.fail.patterns else child.fail.output
+                queue.append(child)
+    
+    def match(self, text: str) -> Optional[IntentMatch]:
+        """
+        Лучшее намерение в сообщении
+        
+        Returns:
+            Найденное намерение или None, если сообщение нужно передать AI
+        """
+        normalized = normalize_text(text)
+        words = normalized.count(" ") + 1 if normalized else 0
+        length = len(normalized)
+        best: Optional[IntentMatch] = None
+        best_rank = None
+        
+        node = self._root
+        for end, char in enumerate(normalized, 1):
+            while node is not self._root and char not in node.children:
+                node = node.fail
+            node = node.children.get(char, self._root)
+            
+            found = node if node.patterns else node.output
+            while found is not None:
+                for size, prefix, intent, pattern in found.patterns:
+                    start = end - size
+                    if start and normalized[start - 1] != " ":
+                        continue
+                    if not prefix and end < length and normalized[end] != " ":
+                        continue
+                    if intent.max_words and words > intent.max_words:
+                        continue
+                    rank = (intent.priority, size, -start)
+                    if best_rank is None or rank > best_rank:
+                        best, best_rank = IntentMatch(intent, pattern, start), rank
+                found = found.output
+        
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits[best.intent.name] = self.hits.get(best.intent.name, 0) + 1
+        return best
+    
+    def respond(self, text: str, first_name: str = "") -> Optional[str]:
+        """
+        Готовый ответ на сообщение
+        
+        В ответе подставляется {first_name} (экранированное для HTML).
+        
+        Returns:
+            Текст ответа или None, если подходящего намерения нет
+        """
+        found = self.match(text)
+        if found is None:
+            return None
+        return random.choice(found.intent.responses).replace("{first_name}", html.escape(first_name or ""))
+    
+    def stats(self) -> Dict[str, int]:
+        """Число сообщений с готовым ответом и переданных AI"""
+        return {
+            "intents": len(self.intents),
+            "answered": sum(self.hits.values()),
+            "passed": self.misses
+        }
+
+
+# Создаем глобальный экземпляр
+intent_router = IntentRouter.from_file(INTENTS_FILE)
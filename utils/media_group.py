@@ -0,0 +1,76 @@
+"""
+Сборка альбомов (media group) из отдельных сообщений
+"""
+
+import asyncio
+from typing import Dict, List, Optional
+from aiogram import types
+
+from config import MEDIA_GROUP_WINDOW
+
+# Telegram допускает не больше 10 элементов в альбоме
+MEDIA_GROUP_MAX_PARTS = 10
+
+
+class _PendingGroup:
+    """Собираемый альбом"""
+    
+    __slots__ = ("messages", "updated_at", "complete")
+    
+    def __init__(self, message: types.Message, now: float):
+        self.messages: List[types.Message] = [message]
+        self.updated_at = now
+        self.complete = asyncio.Event()
+
+
+class MediaGroupCollector:
+    """
+    Сборщик частей альбома
+    
+    Telegram присылает каждую фотографию альбома отдельным сообщением с общим
+    media_group_id. Первое сообщение ждет, пока новые части перестанут приходить
+    в течение MEDIA_GROUP_WINDOW секунд, и получает весь альбом; обработчики
+    остальных частей получают None и ничего не делают.
+    """
+    
+    def __init__(self, window: float = MEDIA_GROUP_WINDOW):
+        self.window = window
+        self._groups: Dict[str, _PendingGroup] = {}
+    
+    async def collect(self, message: types.Message) -> Optional[List[types.Message]]:
+        """
+        Добавление части альбома
+        
+        Returns:
+            Все части альбома по порядку - для первого сообщения, None - для остальных
+        """
+        loop = asyncio.get_running_loop()
+        group_id = message.media_group_id
+        
+        group = self._groups.get(group_id)
+        if group is not None:
+            group.messages.append(message)
+            group.updated_at = loop.time()
+            if len(group.messages) >= MEDIA_GROUP_MAX_PARTS:
+                group.complete.set()
+            return None
+        
+        group = _PendingGroup(message, loop.time())
+        self._groups[group_id] = group
+        try:
+            while not group.complete.is_set():
+                delay = group.updated_at + self.window - loop.time()
+                if delay <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(group.complete.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            del self._groups[group_id]
+        
+        return sorted(group.messages, key=lambda part: part.message_id)
+
+
+# Создаем глобальный экземпляр
+media_group_collector = MediaGroupCollector()
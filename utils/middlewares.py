@@ -0,0 +1,42 @@
+"""
+Middleware для бота
+"""
+
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+from database.activity import activity_buffer
+from database.archive import message_archive, record_from_message
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """Учет активности пользователя один раз на каждое входящее сообщение"""
+    
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any]
+    ) -> Any:
+        if event.from_user:
+            # Счетчик сообщений, как и раньше, учитывает только текст (без команд)
+            is_text_message = bool(event.text) and not event.text.startswith("/")
+            activity_buffer.touch(event.from_user.id, messages=1 if is_text_message else 0)
+        
+        return await handler(event, data)
+
+
+class MessageArchiveMiddleware(BaseMiddleware):
+    """Постановка входящих сообщений в очередь архива"""
+    
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any]
+    ) -> Any:
+        if event.from_user:
+            await message_archive.enqueue(record_from_message(event))
+        
+        return await handler(event, data)
@@ -0,0 +1,333 @@
+"""
+Маршрутизация запросов по цепочке моделей: circuit breaker, p95 задержки, хеджирование
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Any
+from loguru import logger
+
+from config import (
+    AI_BREAKER_THRESHOLD,
+    AI_BREAKER_COOLDOWN,
+    AI_LATENCY_WINDOW,
+    AI_LATENCY_MIN_SAMPLES,
+    AI_HEDGE_ENABLED,
+    AI_HEDGE_DELAY
+)
+
+
+class NoModelAvailableError(Exception):
+    """Все модели цепочки недоступны или вернули ошибку"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для одной модели
+    
+    После threshold ошибок подряд модель исключается из маршрутизации на cooldown секунд,
+    затем пропускается один пробный запрос: успех закрывает breaker, ошибка снова открывает.
+    """
+    
+    def __init__(self, threshold: int = AI_BREAKER_THRESHOLD, cooldown: float = AI_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+    
+    @property
+    def state(self) -> str:
+        """Состояние: closed, open или half-open"""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+    
+    def allow(self) -> bool:
+        """Можно ли отправить запрос"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial:
+            return True
+        return False
+    
+    def on_start(self):
+        """Запрос отправлен (в состоянии half-open - это пробный запрос)"""
+        if self.state == "half-open":
+            self._trial = True
+    
+    def on_cancel(self):
+        """Запрос отменен без результата: пробный запрос можно повторить"""
+        self._trial = False
+    
+    def record_success(self):
+        """Успешный ответ"""
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+    
+    def record_failure(self) -> bool:
+        """
+        Ошибка запроса
+        
+        Returns:
+            True, если breaker открылся
+        """
+        self.failures += 1
+        was_trial = self._trial
+        self._trial = False
+        if was_trial or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+
+class LatencyWindow:
+    """Скользящее окно задержек для расчета p95"""
+    
+    def __init__(self, size: int = AI_LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+    
+    def add(self, seconds: float):
+        """Добавление замера"""
+        self.samples.append(seconds)
+    
+    def add_censored(self, seconds: float):
+        """
+        Добавление цензурированного замера: запрос отменен, задержка не меньше seconds
+        
+        Нижняя оценка ниже текущего p95 ничего не говорит о хвосте и занизила бы его,
+        поэтому в окно попадает только оценка не ниже p95.
+        """
+        p95 = self.p95
+        if p95 is not None and seconds >= p95:
+            self.samples.append(seconds)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        """Перцентиль задержки или None, если замеров нет"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(int(q * len(ordered)), len(ordered) - 1)
+        return ordered[index]
+    
+    @property
+    def p95(self) -> Optional[float]:
+        return self.percentile(0.95)
+
+
+class ModelRouter:
+    """
+    Маршрутизатор запросов по упорядоченной цепочке моделей
+    
+    Модели с достаточным числом замеров упорядочиваются по p95 задержки, остальные
+    идут за ними в порядке конфигурации; модели с открытым breaker пропускаются.
+    При ошибке запрос повторяется на следующей модели, при хеджировании резервная
+    модель запускается, если основная не ответила за AI_HEDGE_DELAY секунд.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        models: List[str],
+        hedge_enabled: bool = AI_HEDGE_ENABLED,
+        hedge_delay: float = AI_HEDGE_DELAY,
+        min_samples: int = AI_LATENCY_MIN_SAMPLES
+    ):
+        self.name = name
+        self.models = list(models)
+        self.hedge_enabled = hedge_enabled
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        self.breakers: Dict[str, CircuitBreaker] = {model: CircuitBreaker() for model in self.models}
+        self.latency: Dict[str, LatencyWindow] = {model: LatencyWindow() for model in self.models}
+        self.hedges = 0
+    
+    def candidates(self) -> List[str]:
+        """Доступные модели в порядке попыток"""
+        available = [model for model in self.models if self.breakers[model].allow()]
+        measured = [model for model in available if len(self.latency[model].samples) >= self.min_samples]
+        unmeasured = [model for model in available if model not in measured]
+        measured.sort(key=lambda model: self.latency[model].p95)
+        return measured + unmeasured
+    
+    def _record_success(self, model: str, started: float):
+        self.breakers[model].record_success()
+        self.latency[model].add(time.monotonic() - started)
+    
+    def _record_failure(self, model: str, error: Optional[BaseException]):
+        if self.breakers[model].record_failure():
+            logger.warning(f"Модель {model} ({self.name}) временно исключена: {error}")
+        else:
+            logger.warning(f"Ошибка модели {model} ({self.name}): {error}")
+    
+    def _record_cancelled(self, model: str, started: float):
+        # Проигравший хедж-запрос: время ожидания - только нижняя оценка его задержки
+        self.breakers[model].on_cancel()
+        self.latency[model].add_censored(time.monotonic() - started)
+    
+    async def run(self, call: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        Выполнение запроса с переключением на резервные модели
+        
+        Args:
+            call: Запрос к конкретной модели; ошибка или пустой результат - повод перейти к следующей
+        
+        Returns:
+            Первый успешный результат
+        
+        Raises:
+            NoModelAvailableError: ни одна модель не ответила
+        """
+        candidates = self.candidates()
+        if not candidates:
+            raise NoModelAvailableError(f"Нет доступных моделей ({self.name})")
+        
+        pending: Dict[asyncio.Task, tuple] = {}
+        next_index = 0
+        last_error: Optional[BaseException] = None
+        
+        def launch():
+            nonlocal next_index
+            model = candidates[next_index]
+            next_index += 1
+            self.breakers[model].on_start()
+            pending[asyncio.create_task(call(model))] = (model, time.monotonic())
+        
+        launch()
+        try:
+            while pending:
+                can_hedge = self.hedge_enabled and len(pending) == 1 and next_index < len(candidates)
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                if not done:
+                    # Основная модель отвечает слишком долго - запускаем резервную параллельно
+                    self.hedges += 1
+                    launch()
+                    continue
+                
+                for task in done:
+                    model, started = pending.pop(task)
+                    error = task.exception()
+                    if error is None and task.result():
+                        self._record_success(model, started)
+                        return task.result()
+                    last_error = error or ValueError("пустой ответ")
+                    self._record_failure(model, last_error)
+                
+                if not pending and next_index < len(candidates):
+                    launch()
+        finally:
+            for task, (model, started) in pending.items():
+                task.cancel()
+                self._record_cancelled(model, started)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        raise NoModelAvailableError(f"Все модели ({self.name}) вернули ошибку: {last_error}")
+    
+    async def stream(self, open_stream: Callable[[str], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Потоковый запрос с переключением на резервные модели
+        
+        Модели переключаются только до первого фрагмента ответа; задержкой считается
+        время до первого фрагмента. Хеджирование работает так же, как в run.
+        
+        Args:
+            open_stream: Открытие потока ответа конкретной модели
+        
+        Yields:
+            Фрагменты ответа модели, первой вернувшей текст
+        """
+        candidates = self.candidates()
+        if not candidates:
+            raise NoModelAvailableError(f"Нет доступных моделей ({self.name})")
+        
+        pending: Dict[asyncio.Task, tuple] = {}
+        next_index = 0
+        last_error: Optional[BaseException] = None
+        winner = None
+        
+        def launch():
+            nonlocal next_index
+            model = candidates[next_index]
+            next_index += 1
+            self.breakers[model].on_start()
+            stream = open_stream(model).__aiter__()
+            pending[asyncio.ensure_future(stream.__anext__())] = (model, time.monotonic(), stream)
+        
+        launch()
+        try:
+            while pending and winner is None:
+                can_hedge = self.hedge_enabled and len(pending) == 1 and next_index < len(candidates)
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                if not done:
+                    self.hedges += 1
+                    launch()
+                    continue
+                
+                for task in done:
+                    model, started, stream = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        # Ответ, пришедший в ту же итерацию после победителя, тоже успешен:
+                        # иначе пробный запрос half-open breaker так и остался бы незавершенным
+                        self._record_success(model, started)
+                        if winner is None:
+                            winner = (model, stream, task.result())
+                            continue
+                    if isinstance(error, StopAsyncIteration):
+                        error = ValueError("пустой ответ")
+                    if error is not None:
+                        last_error = error
+                        self._record_failure(model, error)
+                    await stream.aclose()
+                
+                if winner is None and not pending and next_index < len(candidates):
+                    launch()
+        finally:
+            for task, (model, started, stream) in pending.items():
+                task.cancel()
+                self._record_cancelled(model, started)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                for model, started, stream in pending.values():
+                    await stream.aclose()
+        
+        if winner is None:
+            raise NoModelAvailableError(f"Все модели ({self.name}) вернули ошибку: {last_error}")
+        
+        model, stream, first_chunk = winner
+        try:
+            yield first_chunk
+            async for chunk in stream:
+                yield chunk
+        except Exception as e:
+            self._record_failure(model, e)
+            raise
+        finally:
+            await stream.aclose()
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Состояние моделей: breaker, p95 и число замеров"""
+        return {
+            model: {
+                "state": self.breakers[model].state,
+                "p95": self.latency[model].p95,
+                "samples": len(self.latency[model].samples)
+            }
+            for model in self.models
+        }
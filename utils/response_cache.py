@@ -0,0 +1,123 @@
+"""
+Кэш ответов AI
+"""
+
+import hashlib
+import re
+from typing import Optional
+from loguru import logger
+
+from config import AI_CACHE_SIZE, AI_CACHE_TTL, AI_CACHE_MAX_MB, REDIS_URL
+from database.cache import TTLCache
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+# Префикс ключей в Redis
+REDIS_KEY_PREFIX = "becks:ai:"
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация текста для ключа кэша: регистр, пробелы и пунктуация по краям"""
+    return re.sub(r"\s+", " ", text.casefold()).strip(" .,!?;:…")
+
+
+def _sizeof(value: str) -> int:
+    """Оценка памяти, занимаемой ответом"""
+    return len(value.encode("utf-8"))
+
+
+class ResponseCache:
+    """Кэш ответов AI: LRU + TTL в памяти процесса и, если задан REDIS_URL, общий кэш в Redis"""
+    
+    def __init__(
+        self,
+        max_size: int = AI_CACHE_SIZE,
+        ttl: float = AI_CACHE_TTL,
+        max_mb: float = AI_CACHE_MAX_MB,
+        redis_url: str = REDIS_URL
+    ):
+        self.ttl = ttl
+        self.local = TTLCache(max_size=max_size, ttl=ttl, max_bytes=int(max_mb * 1024 * 1024), sizeof=_sizeof)
+        self._redis = None
+        
+        if redis_url:
+            if aioredis is None:
+                logger.warning("REDIS_URL задан, но пакет redis не установлен - кэш AI только в памяти")
+            else:
+                self._redis = aioredis.from_url(redis_url, decode_responses=True)
+        
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+    
+    @staticmethod
+    def make_key(text: str, model: str, prompt_version: str) -> str:
+        """Ключ кэша по нормализованному тексту, модели и версии промпта"""
+        raw = f"{prompt_version}\x00{model}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    async def get(self, key: str) -> Optional[str]:
+        """Получение ответа из кэша"""
+        value = self.local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        
+        if self._redis is not None:
+            try:
+                value = await self._redis.get(REDIS_KEY_PREFIX + key)
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Ошибка чтения из Redis: {e}")
+                value = None
+            
+            if value is not None:
+                self.local.set(key, value)
+                self.hits += 1
+                self.redis_hits += 1
+                return value
+        
+        self.misses += 1
+        return None
+    
+    async def set(self, key: str, value: str):
+        """Сохранение ответа в кэш"""
+        self.local.set(key, value)
+        
+        if self._redis is not None:
+            try:
+                await self._redis.set(REDIS_KEY_PREFIX + key, value, ex=int(self.ttl))
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Ошибка записи в Redis: {e}")
+    
+    async def close(self):
+        """Закрытие соединения с Redis"""
+        if self._redis is not None:
+            # В redis<5 у клиента нет aclose(), только close()
+            close = getattr(self._redis, "aclose", None) or self._redis.close
+            await close()
+            self._redis = None
+    
+    def stats(self) -> dict:
+        """Метрики кэша"""
+        total = self.hits + self.misses
+        local = self.local.stats()
+        return {
+            "size": local["size"],
+            "bytes": local["bytes"],
+            "evictions": local["evictions"],
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "redis_errors": self.redis_errors,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+# Создаем глобальный экземпляр
+response_cache = ResponseCache()
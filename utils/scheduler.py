@@ -0,0 +1,182 @@
+"""
+Планировщик запросов к AI сервисам: ограничение параллельности и честная очередь
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+from loguru import logger
+
+from config import (
+    AI_TEXT_CONCURRENCY,
+    AI_IMAGE_CONCURRENCY,
+    AI_QUEUE_SIZE,
+    AI_QUEUE_PER_USER,
+    AI_TEXT_DEADLINE,
+    AI_IMAGE_DEADLINE
+)
+
+
+class SchedulerError(Exception):
+    """Запрос к AI не был выполнен планировщиком"""
+
+
+class QueueFullError(SchedulerError):
+    """Очередь переполнена, запрос отклонен сразу"""
+
+
+class DeadlineExceededError(SchedulerError):
+    """Запрос не дождался свободного слота до дедлайна"""
+
+
+class FairPool:
+    """
+    Пул слотов с ограничением параллельности и честной очередью
+    
+    Ожидающие запросы хранятся в отдельной очереди для каждого пользователя,
+    освободившийся слот достается пользователям по кругу - один активный чат
+    не может занять всю пропускную способность.
+    """
+    
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_queue_per_user: int, deadline: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.deadline = deadline
+        self._active = 0
+        self._queued = 0
+        self._queues: "OrderedDict[int, Deque[asyncio.Future]]" = OrderedDict()
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+    
+    def _dequeue(self, user_id: int, waiter: asyncio.Future):
+        """Удаление ожидающего запроса из очереди пользователя"""
+        queue = self._queues.get(user_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self._queued -= 1
+        if not queue:
+            del self._queues[user_id]
+    
+    def _wake_next(self):
+        """Передача свободного слота следующему пользователю по кругу"""
+        while self._queues and self._active < self.concurrency:
+            user_id, queue = self._queues.popitem(last=False)
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                # Пользователь уходит в конец круга
+                self._queues[user_id] = queue
+            if not waiter.done():
+                self._active += 1
+                waiter.set_result(None)
+    
+    async def acquire(self, user_id: int, deadline_at: float):
+        """
+        Ожидание свободного слота
+        
+        Raises:
+            QueueFullError: очередь пула или пользователя заполнена
+            DeadlineExceededError: слот не освободился до дедлайна
+        """
+        if self._active < self.concurrency and not self._queued:
+            self._active += 1
+            return
+        
+        queue = self._queues.get(user_id)
+        if self._queued >= self.max_queue or (queue is not None and len(queue) >= self.max_queue_per_user):
+            self.rejected += 1
+            raise QueueFullError(f"Очередь AI ({self.name}) переполнена")
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self._queued += 1
+        
+        try:
+            await asyncio.wait({waiter}, timeout=max(deadline_at - time.monotonic(), 0))
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self._dequeue(user_id, waiter)
+            raise
+        
+        if not waiter.done():
+            waiter.cancel()
+            self._dequeue(user_id, waiter)
+            self.expired += 1
+            raise DeadlineExceededError(f"Истекло время ожидания очереди AI ({self.name})")
+    
+    def release(self):
+        """Освобождение слота"""
+        self._active -= 1
+        self.completed += 1
+        self._wake_next()
+    
+    def stats(self) -> Dict[str, int]:
+        """Статистика пула"""
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "concurrency": self.concurrency,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired
+        }
+
+
+class AIScheduler:
+    """
+    Планировщик запросов к AI
+    
+    Текстовые ответы и анализ изображений выполняются в отдельных пулах:
+    общий лимит параллельных запросов - сумма лимитов пулов, поэтому медленные
+    запросы к vision-модели не отнимают слоты у ответов в чате.
+    """
+    
+    def __init__(self):
+        self.pools: Dict[str, FairPool] = {
+            "text": FairPool("text", AI_TEXT_CONCURRENCY, AI_QUEUE_SIZE, AI_QUEUE_PER_USER, AI_TEXT_DEADLINE),
+            "image": FairPool("image", AI_IMAGE_CONCURRENCY, AI_QUEUE_SIZE, AI_QUEUE_PER_USER, AI_IMAGE_DEADLINE)
+        }
+    
+    @asynccontextmanager
+    async def slot(self, pool: str, user_id: Optional[int] = None, deadline: Optional[float] = None) -> AsyncIterator[float]:
+        """
+        Слот для выполнения запроса
+        
+        Args:
+            pool: Пул ("text" или "image")
+            user_id: ID пользователя (для честной очереди); None - общая очередь
+            deadline: Дедлайн запроса в секундах (по умолчанию - дедлайн пула)
+        
+        Yields:
+            Сколько секунд осталось до дедлайна (используется как таймаут самого запроса)
+        """
+        fair_pool = self.pools[pool]
+        deadline_at = time.monotonic() + (deadline if deadline is not None else fair_pool.deadline)
+        
+        try:
+            await fair_pool.acquire(user_id or 0, deadline_at)
+        except SchedulerError as e:
+            logger.warning(f"{e} (пользователь {user_id}, {fair_pool.stats()})")
+            raise
+        
+        try:
+            yield max(deadline_at - time.monotonic(), 0.001)
+        finally:
+            fair_pool.release()
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Статистика всех пулов"""
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+# Создаем глобальный экземпляр
+ai_scheduler = AIScheduler()
@@ -0,0 +1,155 @@
+"""
+Объединение одинаковых одновременных запросов (single-flight)
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, Type
+
+
+class _Broadcast:
+    """Поток фрагментов, который читают несколько получателей"""
+    
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+    
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+    
+    async def pump(self, source: AsyncIterator[Any]):
+        """Чтение исходного потока (выполняется в отдельной задаче)"""
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+    
+    async def iterate(self) -> AsyncIterator[Any]:
+        """Все фрагменты потока с начала, включая уже полученные"""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Объединение одновременных запросов с одинаковым ключом
+    
+    Пока запрос с ключом выполняется, повторные вызовы не создают новый запрос,
+    а получают результат уже идущего. После завершения ключ освобождается -
+    это не кэш готовых ответов.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.shared = 0
+    
+    @staticmethod
+    def _forget(calls: Dict[Hashable, Any], key: Hashable, call: Any):
+        """Освобождение ключа завершенного запроса"""
+        if calls.get(key) is call:
+            del calls[key]
+    
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[Any]],
+        retry_on: Tuple[Type[BaseException], ...] = ()
+    ) -> Any:
+        """
+        Выполнение запроса или ожидание уже идущего с тем же ключом
+        
+        Args:
+            key: Ключ запроса
+            func: Запрос (вызывается только первым из одновременных вызовов)
+            retry_on: Ошибки, которые относятся к самому первому вызову (например, отказ
+                очереди его пользователя): присоединившиеся вызовы в этом случае
+                повторяют запрос со своим func, а не получают чужую ошибку
+        
+        Returns:
+            Результат запроса (ошибка запроса пробрасывается всем ожидающим)
+        """
+        while True:
+            task = self._calls.get(key)
+            leader = task is None
+            if leader:
+                task = asyncio.ensure_future(func())
+                self._calls[key] = task
+                task.add_done_callback(lambda _, task=task: self._forget(self._calls, key, task))
+            else:
+                self.shared += 1
+        
+            try:
+                # Отмена одного из ожидающих не отменяет общий запрос
+                return await asyncio.shield(task)
+            except retry_on:
+                if leader:
+                    raise
+                # Неудачный запрос уже не должен находиться по ключу
+                self._forget(self._calls, key, task)
+    
+    async def stream(
+        self,
+        key: Hashable,
+        open_stream: Callable[[], AsyncIterator[Any]],
+        retry_on: Tuple[Type[BaseException], ...] = ()
+    ) -> AsyncIterator[Any]:
+        """
+        Потоковый вариант do: все получатели читают один поток с начала
+        
+        Args:
+            key: Ключ запроса
+            open_stream: Открытие потока (вызывается только первым из одновременных вызовов)
+            retry_on: Ошибки первого вызова, после которых присоединившиеся получатели
+                открывают поток сами (только если еще не получили ни одного фрагмента)
+        
+        Yields:
+            Фрагменты общего потока
+        """
+        while True:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = _Broadcast()
+                self._streams[key] = broadcast
+                broadcast.task = asyncio.ensure_future(broadcast.pump(open_stream()))
+                broadcast.task.add_done_callback(
+                    lambda _, broadcast=broadcast: self._forget(self._streams, key, broadcast)
+                )
+            else:
+                self.shared += 1
+        
+            delivered = False
+            try:
+                async for chunk in broadcast.iterate():
+                    delivered = True
+                    yield chunk
+                return
+            except retry_on:
+                if leader or delivered:
+                    raise
+                # Поток завершился раньше, чем его задача сняла ключ
+                self._forget(self._streams, key, broadcast)
+    
+    def stats(self) -> Dict[str, int]:
+        """Число выполняющихся и объединенных запросов"""
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "shared": self.shared
+        }
@@ -0,0 +1,130 @@
+"""
+Потоковая отправка ответов AI с постепенным редактированием сообщения
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Optional
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.utils.chat_action import ChatActionSender
+from loguru import logger
+
+from config import STREAM_EDIT_INTERVAL, STREAM_MIN_DELTA
+
+# Ограничение Telegram на длину текста сообщения
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class StreamingReply:
+    """
+    Ответ, который появляется по мере генерации
+    
+    Сразу отправляет действие "печатает", первое сообщение - как только пришли первые
+    фрагменты, затем редактирует его не чаще одного раза в STREAM_EDIT_INTERVAL секунд
+    (Telegram ограничивает частоту правок), последняя правка содержит полный текст.
+    """
+    
+    def __init__(
+        self,
+        message: types.Message,
+        render: Callable[[str], str],
+        edit_interval: float = STREAM_EDIT_INTERVAL,
+        min_delta: int = STREAM_MIN_DELTA
+    ):
+        self.message = message
+        self.render = render
+        self.edit_interval = edit_interval
+        self.min_delta = min_delta
+        self.sent: Optional[types.Message] = None
+        self._shown = ""
+        self._next_edit_at = 0.0
+    
+    def _format(self, text: str) -> str:
+        """Текст сообщения в пределах лимита Telegram"""
+        rendered = self.render(text)
+        if len(rendered) > TELEGRAM_MESSAGE_LIMIT:
+            rendered = rendered[:TELEGRAM_MESSAGE_LIMIT - 1] + "…"
+        return rendered
+    
+    async def _show(self, text: str):
+        """Отправка или правка сообщения"""
+        rendered = self._format(text)
+        try:
+            if self.sent is None:
+                self.sent = await self.message.answer(rendered)
+            else:
+                await self.sent.edit_text(rendered)
+            self._shown = text
+        except TelegramRetryAfter as e:
+            # Превышен лимит правок: пропускаем промежуточные обновления до конца паузы
+            self._next_edit_at = time.monotonic() + e.retry_after
+            return
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+            self._shown = text
+        self._next_edit_at = time.monotonic() + self.edit_interval
+    
+    async def run(self, chunks: AsyncIterator[str]) -> str:
+        """
+        Отправка ответа из потока фрагментов
+        
+        Returns:
+            Полный текст ответа
+        """
+        text = ""
+        stream = chunks.__aiter__()
+        
+        # До первого фрагмента пользователь видит "печатает..."
+        async with ChatActionSender.typing(chat_id=self.message.chat.id, bot=self.message.bot):
+            async for chunk in stream:
+                text += chunk
+                if text.strip():
+                    break
+        
+        if not text.strip():
+            return text
+        
+        await self._show(text)
+        
+        async for chunk in stream:
+            text += chunk
+            if time.monotonic() < self._next_edit_at:
+                continue
+            if len(text) - len(self._shown) < self.min_delta:
+                continue
+            await self._show(text)
+        
+        # Финальная правка с полным текстом; при лимите дожидаемся окончания паузы
+        while text != self._shown:
+            delay = self._next_edit_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._show(text)
+        
+        return text
+
+
+async def send_streaming_reply(
+    message: types.Message,
+    chunks: AsyncIterator[str],
+    render: Callable[[str], str] = lambda text: text
+) -> str:
+    """
+    Отправка потокового ответа на сообщение
+    
+    Args:
+        message: Сообщение пользователя
+        chunks: Фрагменты ответа
+        render: Оформление текста ответа (вызывается для частичного и полного текста)
+    
+    Returns:
+        Полный текст ответа
+    """
+    reply = StreamingReply(message, render)
+    try:
+        return await reply.run(chunks)
+    except Exception as e:
+        logger.error(f"Ошибка при потоковой отправке ответа: {e}")
+        raise